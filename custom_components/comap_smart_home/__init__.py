@@ -1,16 +1,29 @@
 """ComapSmartHome custom component."""
 
-from asyncio import timeout
+import asyncio
 from datetime import timedelta
 import logging
-from datetime import timedelta
+
+import httpx
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-
-from .api import ComapClient
-from .const import DOMAIN, COMAP_SENSOR_SCAN_INTERVAL
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.util.ssl import get_default_context
+from homeassistant.helpers.storage import Store
+
+from .api import ComapClient, DEFAULT_RATE_LIMIT
+from .coordinator import ComapCoordinator
+from .const import (
+    DOMAIN,
+    COMAP_SENSOR_SCAN_INTERVAL,
+    COMAP_SLOW_SCAN_INTERVAL,
+    COMAP_MIN_SCAN_INTERVAL,
+    COMAP_MAX_SCAN_INTERVAL,
+    COMAP_WRITE_DELAY,
+    COMAP_RATE_LIMIT,
+    STORAGE_VERSION,
+)
 
 from homeassistant.const import (
     CONF_USERNAME,
@@ -28,116 +41,73 @@ async def async_setup_entry(
 ):
     
     config = entry.data
-    api_client = ComapClient(username=config[CONF_USERNAME], password=config[CONF_PASSWORD])
+    # Jetons Cognito et logement mémorisés : évite le login par mot de passe au redémarrage
+    store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}", private=True)
+    auth_state = await store.async_load()
+    try:
+        api_client = await ComapClient.async_create(
+            username=config[CONF_USERNAME],
+            password=config[CONF_PASSWORD],
+            auth_state=auth_state,
+            rate_limit=entry.options.get(COMAP_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+            # Session HTTP/2 propre au client, fermée au déchargement
+            verify=get_default_context(),
+        )
+    except httpx.HTTPError as err:
+        raise ConfigEntryNotReady(f"Unable to reach Comap: {err}") from err
+    # La session est fermée au déchargement (ou si la mise en place échoue)
+    entry.async_on_unload(api_client.async_close)
+
+    def save_auth_state():
+        store.async_delay_save(lambda: api_client.auth_state, 10)
+
+    api_client.token_listener = save_auth_state
+    save_auth_state()
 
     refresh_interval = entry.options.get(COMAP_SENSOR_SCAN_INTERVAL, 5)
-
-    # Fonction qui récupère les données de l'API
-    async def async_fetch_data():
-        try:
-            data = {}
-            temperatures = await api_client.get_custom_temperatures()
-            housing = await api_client.async_gethousing_data()
-            connected_objects = await api_client.get_housing_connected_objects()
-            thermal_details = await api_client.get_thermal_details()
-            for zone in thermal_details.get("zones"):
-                zone["heating_system_state"] = thermal_details["heating_system_state"]
-            programs = await api_client.get_programs()
-            prglist = programs.get("programs")
-            parsed_programs = {}
-            active_program_name = None
-            for program in prglist:
-                parsed_programs.update({program["title"]: program["id"]})
-                if program["is_activated"]:
-                    active_program_name = program["title"]
-            active_program = await api_client.get_active_program()
-
-            schedules = await api_client.get_schedules()
-            parsed_schedules = {}
-            for schedule in schedules:
-                parsed_schedules.update({schedule["title"]: schedule["id"]})
-
-
-            comap_temperatures = [
-                {
-                    "id": "night",
-                    "name": "Nuit",
-                    "value": temperatures["night"],
-                    "icon": "mdi:weather-night"
-                },
-                {
-                    "id": "away",
-                    "name": "Absence",
-                    "value": temperatures["away"],
-                    "icon": "mdi:home-export-outline"
-                },
-                {
-                    "id": "frost_protection",
-                    "name": "Hors Gel",
-                    "value": temperatures["frost_protection"],
-                    "icon": "mdi:snowflake"
-                },
-                {
-                    "id": "presence_1",
-                    "name": "Présence 1",
-                    "value": temperatures["connected"]["presence_1"],
-                    "icon": "mdi:numeric-1-circle-outline"
-                },
-                {
-                    "id": "presence_2",
-                    "name": "Présence 2",
-                    "value": temperatures["connected"]["presence_2"],
-                    "icon": "mdi:numeric-2-circle-outline"
-                },
-                {
-                    "id": "presence_3",
-                    "name": "Présence 3",
-                    "value": temperatures["connected"]["presence_3"],
-                    "icon": "mdi:numeric-3-circle-outline"
-                },
-                {
-                    "id": "presence_4",
-                    "name": "Présence 4",
-                    "value": temperatures["connected"]["presence_4"],
-                    "icon": "mdi:numeric-4-circle-outline"
-
-                }
-            ]
-
-            data = {
-                "temperatures": temperatures,
-                "housing" : housing,
-                "thermal_details": thermal_details,
-                "connected_objects": connected_objects,
-                "schedules": schedules,
-                "programs": programs,
-                "parsed_programs": parsed_programs,
-                "active_program": active_program,
-                "active_program_name" : active_program_name,
-                "parsed_schedules": parsed_schedules,
-                "comap_temperatures": comap_temperatures,
-            }
-
-            return data
-        
-        except Exception as err:
-            raise UpdateFailed(f"Error fetching data: {err}")
-        
-    # Configure le coordinateur
-    coordinator = DataUpdateCoordinator(
-        hass,
-        logging.getLogger(__name__),
-        name="Comap Smart Home Data",
-        update_method=async_fetch_data,
-        update_interval=timedelta(minutes=refresh_interval),
-    )
-
-    # Charge les données pour la première fois
-    await coordinator.async_config_entry_first_refresh()
-
-    # Stocke le coordinateur dans hass.data pour qu'il soit accessible par les sensors
+    slow_refresh_interval = entry.options.get(COMAP_SLOW_SCAN_INTERVAL, 60)
+    min_refresh_interval = entry.options.get(COMAP_MIN_SCAN_INTERVAL, 1)
+    max_refresh_interval = entry.options.get(COMAP_MAX_SCAN_INTERVAL, 30)
+    write_delay = entry.options.get(COMAP_WRITE_DELAY, 1.0)
+
+    # Un coordinateur par logement du compte, sur la même session
+    coordinators = {}
+    for housing_id in api_client.housing_ids:
+        coordinator = ComapCoordinator(
+            hass,
+            api_client,
+            housing_id,
+            update_interval=timedelta(minutes=refresh_interval),
+            slow_update_interval=timedelta(minutes=slow_refresh_interval),
+            write_delay=write_delay,
+            min_update_interval=timedelta(minutes=min_refresh_interval),
+            max_update_interval=timedelta(minutes=max_refresh_interval),
+        )
+        entry.async_on_unload(coordinator.async_shutdown)
+        coordinators[housing_id] = coordinator
+
+    # Charge les données pour la première fois, tous les logements en parallèle
+    try:
+        await asyncio.gather(
+            *(
+                coordinator.async_config_entry_first_refresh()
+                for coordinator in coordinators.values()
+            )
+        )
+    except ConfigEntryNotReady:
+        if api_client.housings_restored:
+            # Logement peut-être retiré du compte : la liste mémorisée est
+            # oubliée, park/housings est relu au prochain essai
+            api_client.housings = []
+            await store.async_save(api_client.auth_state)
+        raise
+
+    # Client et coordinateurs partagés par toutes les plateformes de l'entrée
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = coordinator
+    hass.data[DOMAIN][entry.entry_id] = {
+        "client": api_client,
+        "coordinators": coordinators,
+    }
 
     # Charge les entités
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
@@ -159,17 +129,18 @@ async def async_setup_entry(
         if not zone_id:
             raise ValueError(f"zone_id for {entity_id} not found")
 
+        coordinator = find_zone_coordinator(hass, zone_id)
+        if coordinator is None:
+            raise ValueError(f"zone {zone_id} not found")
+
         # Appeler l'API pour définir la nouvelle température
         try:
-            await api_client.set_temporary_instruction(zone_id, instruction, duration)
+            await coordinator.async_set_temporary_instruction(zone_id, instruction, duration)
             _LOGGER.info(f"Successfully set {entity_id} temperature to {instruction}")
         except Exception as err:
             _LOGGER.error(f"Failed to set temperature: {err}")
             raise ValueError("Unable to set instruction")
 
-        # Mettre à jour les données via le coordinateur
-        await coordinator.async_request_refresh()
-
     # Enregistrer le service
     hass.services.async_register(
         DOMAIN,
@@ -179,10 +150,22 @@ async def async_setup_entry(
 
     return True
 
+def find_zone_coordinator(hass: HomeAssistant, zone_id):
+    """Return the coordinator of the housing owning a zone."""
+    for entry_data in hass.data.get(DOMAIN, {}).values():
+        for coordinator in entry_data["coordinators"].values():
+            if zone_id in coordinator.data.zones:
+                return coordinator
+    return None
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Handle removal of an entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
 
-    return unload_ok
\ No newline at end of file
+    return unload_ok
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Forget the stored tokens when the entry is deleted."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
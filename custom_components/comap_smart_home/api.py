@@ -1,23 +1,275 @@
-import httpx
-from datetime import datetime
+import asyncio
+import base64
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json as jsonlib
 import logging
-from threading import Lock
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
 
 _LOGGER = logging.getLogger(__name__)
-_TOKEN_LOCK = Lock()
+
+REQUEST_TIMEOUT = 20
+COGNITO_URL = "https://cognito-idp.eu-west-3.amazonaws.com"
+# Access token is renewed in background this many seconds before it expires
+TOKEN_RENEW_MARGIN = 120
+# A request made closer than this to expiry refreshes the token first
+TOKEN_EXPIRY_MARGIN = 30
+# Requests in flight at once on the shared session, all housings included
+MAX_CONCURRENT_REQUESTS = 4
+# Renewals are spread over this many seconds before the margin, so clients
+# started together do not hit Cognito together
+TOKEN_RENEW_JITTER = 60
+# Transient failures (timeouts, 5xx) of idempotent requests are retried
+# with exponential backoff and full jitter
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 1
+RETRYABLE_STATUS = (500, 502, 503, 504)
+IDEMPOTENT_MODES = ("get", "put", "delete")
+# Per account limit (requests per minute, see the options) and burst. The
+# burst is raised at setup so that a full poll of every housing of the
+# account goes through without waiting
+DEFAULT_RATE_LIMIT = 60
+# Ceiling of the option : the process wide limiter allows no more, for all
+# accounts together
+MAX_RATE_LIMIT = 120
+ACCOUNT_RATE_BURST = 10
+ACCOUNT_RATE_RESERVE = 2
+# A throttled (429) request waits for Retry-After, or these many seconds,
+# then is sent again at most MAX_THROTTLE_RETRIES times
+DEFAULT_RETRY_AFTER = 5
+MAX_RETRY_AFTER = 300
+MAX_THROTTLE_RETRIES = 3
+# An endpoint failing this many times in a row is not called for a while,
+# twice as long after each new failure
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_OPEN_TIME = 60
+CIRCUIT_MAX_OPEN_TIME = 900
+# A temporary instruction refused with 409 is removed and sent again this
+# many times at most
+MAX_CONFLICT_RETRIES = 1
+
+
+def token_expiry(token):
+    """Return the `exp` claim (epoch seconds) of a JWT, or None."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(jsonlib.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Rate limiter : callers wait for a token, nothing is dropped.
+
+    Tokens refill at `rate` per second up to `burst`. Reads never take the
+    last `reserve` tokens, so user initiated writes always find headroom.
+    pause() blocks every caller until a given time, for Retry-After.
+    """
+
+    def __init__(self, rate, burst, reserve=0):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._paused_until = 0
+        # Requests served, requests that had to wait, total and longest wait
+        self.requests = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def set_burst(self, burst):
+        """Change the burst, the tokens available moving by as much."""
+        self._refill()
+        self._tokens = max(0, self._tokens + burst - self.burst)
+        self.burst = burst
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def async_acquire(self, write=False):
+        """Wait for a token, return the time waited in seconds."""
+        floor = 0 if write else self.reserve
+        started = time.monotonic()
+        delayed = False
+        while True:
+            paused = self._paused_until - time.monotonic()
+            if paused > 0:
+                delayed = True
+                await asyncio.sleep(paused)
+                continue
+            self._refill()
+            if self._tokens >= floor + 1:
+                self._tokens -= 1
+                break
+            delayed = True
+            await asyncio.sleep((floor + 1 - self._tokens) / self.rate)
+        self.requests += 1
+        if not delayed:
+            return 0
+        waited = time.monotonic() - started
+        self.delayed += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    @property
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "wait_total": round(self.wait_total, 3),
+            "wait_max": round(self.wait_max, 3),
+        }
+
+
+class CircuitBreaker:
+    """Fail fast on an endpoint after repeated transient failures."""
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0
+
+    def check(self, url):
+        if time.monotonic() < self.open_until:
+            raise ComapCircuitOpenException(f"{url} is failing, not called for now")
+
+    def success(self):
+        self.failures = 0
+        self.open_until = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            open_time = min(
+                CIRCUIT_OPEN_TIME * 2 ** (self.failures - CIRCUIT_FAILURE_THRESHOLD),
+                CIRCUIT_MAX_OPEN_TIME,
+            )
+            self.open_until = time.monotonic() + open_time
+
+
+def retry_after(response):
+    """Seconds to wait before calling again, from a 429 response."""
+    value = response.headers.get("Retry-After")
+    delay = None
+    if value is not None:
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+    if delay is None:
+        delay = DEFAULT_RETRY_AFTER
+    return min(max(delay, 0), MAX_RETRY_AFTER)
+
+
+def is_transient(err):
+    """Whether a request error may succeed if retried later."""
+    if isinstance(err, httpx.HTTPStatusError):
+        return err.response.status_code in RETRYABLE_STATUS
+    return isinstance(err, httpx.TransportError)
+
+
+# Request priorities, lowest first : user commands, polls, slow tier reads
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_BULK = 2
+# Priority of the reads made in the current task, writes are always interactive
+request_priority = contextvars.ContextVar("comap_request_priority", default=PRIORITY_BACKGROUND)
+
+
+class PriorityGate:
+    """Bounded concurrency, waiting requests being let in by priority."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = 0
+        # (priority, arrival order, future)
+        self._waiters = []
+        self._order = itertools.count()
+
+    async def async_acquire(self, priority):
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot handed over just before the cancellation : pass it on
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot goes straight to the waiter, _active is unchanged
+                future.set_result(None)
+                return
+        self._active -= 1
+
+
+# Process wide : all config entries (accounts) share the same budgets
+API_RATE_LIMITER = TokenBucket(rate=MAX_RATE_LIMIT / 60, burst=40, reserve=5)
+COGNITO_RATE_LIMITER = TokenBucket(rate=0.5, burst=5)
 
 
 class ComapClient (object):
     _BASEURL = "https://api.comapsmarthome.com/"
-    login_headers = {}
-    login_payload = {}
-    token = ""
-    last_request = ""
-    token_expires = ""
-    clientid = ""
-
-    def __init__(self, username, password, clientid="56jcvrtejpracljtirq7qnob44"):
+    # Read endpoints polled by the coordinator
+    ENDPOINTS = {
+        "housing": "park/housings",
+        "thermal_details": "thermal/housings/{housing}/thermal-details",
+        "connected_objects": "park/housings/{housing}/connected-objects",
+        "temperatures": "thermal/housings/{housing}/custom-temperatures",
+        "programs": "thermal/housings/{housing}/programs",
+        "schedules": "thermal/housings/{housing}/schedules",
+    }
+
+    def __init__(
+        self,
+        username,
+        password,
+        session=None,
+        clientid="56jcvrtejpracljtirq7qnob44",
+        rate_limit=DEFAULT_RATE_LIMIT,
+        verify=True,
+    ):
+        """Build the client without any I/O, see async_create()."""
         self.clientid = clientid
+        # Quota of this account, on top of the process wide API_RATE_LIMITER
+        self.rate_limiter = TokenBucket(
+            rate=min(rate_limit, MAX_RATE_LIMIT) / 60, burst=ACCOUNT_RATE_BURST, reserve=ACCOUNT_RATE_RESERVE
+        )
+        self.throttled = 0
+        # Temporary instructions sent, replaced (removed first) and refused (409)
+        self.instruction_stats = {"sent": 0, "replaced": 0, "conflicts": 0}
+        # One pooled session per client : connections (and TLS sessions) are
+        # kept alive between calls instead of being renegotiated each time.
+        # A session given by the caller is theirs to close
+        self._owns_session = session is None
+        if session is None:
+            session = httpx.AsyncClient(http2=True, timeout=REQUEST_TIMEOUT, verify=verify)
+        self._session = session
         self.login_headers = {
             "Content-Type": "application/x-amz-json-1.1",
             "x-amz-target": "AWSCognitoIdentityProviderService.InitiateAuth",
@@ -32,28 +284,108 @@ class ComapClient (object):
             },
             "ClientId": clientid,
         }
+        self.token = ""
+        self.refresh_token = None
+        self.token_expires_at = 0
+        self.housing = None
+        self.housings = []
+        # True when housings come from auth_state rather than park/housings
+        self.housings_restored = False
+        self._refresh_task = None
+        self._renew_handle = None
+        # Identical GETs in flight, keyed by url and params
+        self._inflight = {}
+        # url -> CircuitBreaker
+        self._breakers = {}
+        self._request_gate = PriorityGate(MAX_CONCURRENT_REQUESTS)
+        # Called whenever tokens change, used to persist auth_state
+        self.token_listener = None
+
+    @classmethod
+    async def async_create(cls, username, password, session=None, auth_state=None, **kwargs):
+        """Build a client, log in (or resume auth_state) and resolve the housing."""
+        client = cls(username, password, session=session, **kwargs)
+        try:
+            await client.async_setup(auth_state)
+        except BaseException:
+            await client.async_close()
+            raise
+        return client
+
+    async def async_setup(self, auth_state=None):
+        state = auth_state or {}
+        if state.get("username") != self.login_payload["AuthParameters"]["USERNAME"]:
+            state = {}
+        self.refresh_token = state.get("refresh_token")
+        if (
+            state.get("access_token")
+            and state.get("expires_at", 0) - time.time() > TOKEN_RENEW_MARGIN
+        ):
+            # Stored access token is still valid : no Cognito round-trip
+            self.token = state["access_token"]
+            self.token_expires_at = state["expires_at"]
+            self._schedule_token_renewal()
+        else:
+            # REFRESH_TOKEN_AUTH, password login only if that fails
+            await self.async_token_refresh()
         try:
-            self.login()
-            housings = self.get_housings()
-            self.housing = housings[0].get("id")
-        except AttributeError as err:
-            raise ComapClientAuthException from err
+            self.housings_restored = bool(state.get("housings"))
+            self.housings = state.get("housings") or await self.async_get_housings()
+            housing_ids = [housing.get("id") for housing in self.housings]
+            if state.get("housing") in housing_ids:
+                self.housing = state["housing"]
+            else:
+                self.housing = housing_ids[0]
+        except (AttributeError, IndexError) as err:
+            raise ComapClientAuthException("No housing found") from err
+        self.rate_limiter.set_burst(
+            max(ACCOUNT_RATE_BURST, ACCOUNT_RATE_RESERVE + len(self.ENDPOINTS) * len(self.housings))
+        )
 
-    def login(self):
+    @property
+    def housing_data(self):
+        """Housing payload resolved at setup, without a new park/housings call."""
+        return self.get_housing_data(self.housing)
+
+    @property
+    def housing_ids(self):
+        """Ids of every housing of the account."""
+        return [housing.get("id") for housing in self.housings]
+
+    def get_housing_data(self, housing_id):
+        for housing in self.housings:
+            if housing.get("id") == housing_id:
+                return housing
+        return None
+
+    @property
+    def rate_stats(self):
+        """How long the requests of this account waited for the limiters."""
+        return {
+            "account": self.rate_limiter.stats,
+            "process": API_RATE_LIMITER.stats,
+            "throttled": self.throttled,
+        }
+
+    @property
+    def auth_state(self):
+        """Data needed to resume this session without a password login."""
+        return {
+            "username": self.login_payload["AuthParameters"]["USERNAME"],
+            "refresh_token": self.refresh_token,
+            "access_token": self.token,
+            "expires_at": self.token_expires_at,
+            "housing": self.housing,
+            "housings": self.housings,
+        }
+
+    async def async_login(self):
+        await COGNITO_RATE_LIMITER.async_acquire()
         try:
-            url = "https://cognito-idp.eu-west-3.amazonaws.com"
-            login_request = httpx.post(
-                url, json=self.login_payload, headers=self.login_headers
+            login_request = await self._session.post(
+                COGNITO_URL, json=self.login_payload, headers=self.login_headers
             )
             login_request.raise_for_status()
-            response = login_request.json()
-            self.last_request = datetime.now()
-            self.token = response.get("AuthenticationResult").get("AccessToken")
-            self.refresh_token = response.get("AuthenticationResult").get(
-                "RefreshToken"
-            )
-            self.token_expires = response.get("AuthenticationResult").get("ExpiresIn")
-
         except httpx.HTTPStatusError as err:
             _LOGGER.error(
                 "Could not set up COMAP client - %s status code. Check your credentials",
@@ -62,48 +394,168 @@ class ComapClient (object):
             raise ComapClientAuthException(
                 "Client set up failed", err.response.status_code
             ) from err
+        self._set_tokens(login_request.json().get("AuthenticationResult"))
 
-    def get_request(self, url, headers=None, params={}):
-        if (datetime.now() - self.last_request).total_seconds() > (
-            self.token_expires - 60
-        ):
-            self.token_refresh()
-        if headers is None:
-            headers = {
-                "Authorization": "Bearer {}".format(self.token),
-                "Content-Type": "application/json",
+    async def async_token_refresh(self):
+        """Renew the access token, concurrent callers share the same refresh."""
+        await asyncio.shield(self._start_token_refresh())
+
+    def _start_token_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(
+                self._async_token_refresh()
+            )
+            self._refresh_task.add_done_callback(self._token_refresh_done)
+        return self._refresh_task
+
+    @staticmethod
+    def _token_refresh_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error("Token refresh failed: %s", task.exception())
+
+    async def _async_token_refresh(self):
+        _LOGGER.debug("Attempting refresh of access token")
+        if self.refresh_token is not None:
+            payload = {
+                "AuthFlow": "REFRESH_TOKEN_AUTH",
+                "AuthParameters": {"REFRESH_TOKEN": self.refresh_token},
+                "ClientId": self.clientid,
             }
-        r = httpx.get(url=url, headers=headers, params=params)
-        r.raise_for_status()
-        return r.json()
+            await COGNITO_RATE_LIMITER.async_acquire()
+            try:
+                login_request = await self._session.post(
+                    COGNITO_URL, json=payload, headers=self.login_headers
+                )
+                login_request.raise_for_status()
+            except httpx.HTTPError as err:
+                _LOGGER.warning("Refresh token failed (%s), logging in again", err)
+            else:
+                self._set_tokens(login_request.json().get("AuthenticationResult"))
+                return
+        await self.async_login()
+
+    def _set_tokens(self, result):
+        self.token = result.get("AccessToken")
+        # REFRESH_TOKEN_AUTH does not return a new refresh token
+        if result.get("RefreshToken"):
+            self.refresh_token = result.get("RefreshToken")
+        expires_at = token_expiry(self.token)
+        if expires_at is None:
+            expires_at = time.time() + result.get("ExpiresIn", 3600)
+        self.token_expires_at = expires_at
+        self._schedule_token_renewal()
+        if self.token_listener is not None:
+            self.token_listener()
+
+    def _schedule_token_renewal(self):
+        if self._renew_handle is not None:
+            self._renew_handle.cancel()
+        delay = max(
+            self.token_expires_at
+            - time.time()
+            - TOKEN_RENEW_MARGIN
+            - random.uniform(0, TOKEN_RENEW_JITTER),
+            0,
+        )
+        self._renew_handle = asyncio.get_running_loop().call_later(
+            delay, self._start_token_refresh
+        )
 
     async def async_request(self, mode, url, headers=None, params={}, json={}):
-        if (datetime.now() - self.last_request).total_seconds() > (
-            self.token_expires - 60
-        ):
-            _LOGGER.debug("Attempting refresh of access token")
-            self.token_refresh()
+        r = await self._async_response(mode, url, headers, params, json)
+        return r.json()
+
+    async def _async_response(self, mode, url, headers=None, params={}, json={}):
+        breaker = self._breakers.setdefault(url, CircuitBreaker())
+        breaker.check(url)
+        attempt = 0
+        throttled = 0
+        while True:
+            try:
+                r = await self._async_authorized_response(mode, url, headers, params, json)
+            except httpx.HTTPError as err:
+                if (
+                    isinstance(err, httpx.HTTPStatusError)
+                    and err.response.status_code == 429
+                    and throttled < MAX_THROTTLE_RETRIES
+                ):
+                    # Requête refusée sans être traitée : tout le compte attend
+                    # Retry-After, puis elle repart dans la file
+                    throttled += 1
+                    self.throttled += 1
+                    delay = retry_after(err.response)
+                    _LOGGER.warning("Comap API throttled %s, waiting %.1fs", url, delay)
+                    self.rate_limiter.pause(delay)
+                    continue
+                if not is_transient(err):
+                    # L'API a répondu : l'erreur vient de la requête
+                    breaker.success()
+                    raise
+                if mode not in IDEMPOTENT_MODES or attempt >= MAX_RETRIES:
+                    breaker.failure()
+                    raise
+                attempt += 1
+                delay = random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+                _LOGGER.debug("%s %s failed (%s), retry in %.1fs", mode, url, err, delay)
+                await asyncio.sleep(delay)
+            else:
+                breaker.success()
+                return r
+
+    async def _async_authorized_response(self, mode, url, headers, params, json):
+        if time.time() > self.token_expires_at - TOKEN_EXPIRY_MARGIN:
+            await self.async_token_refresh()
+        r = await self._async_send(mode, url, headers, params, json)
+        if r.status_code == 401 and headers is None:
+            # Resumed token may have been revoked : renew it and retry once
+            await self.async_token_refresh()
+            r = await self._async_send(mode, url, headers, params, json)
+        r.raise_for_status()
+        return r
+
+    async def _async_send(self, mode, url, headers, params, json):
+        write = mode != "get"
+        waited = await self.rate_limiter.async_acquire(write)
+        waited += await API_RATE_LIMITER.async_acquire(write)
+        if waited > 1:
+            _LOGGER.debug("%s %s waited %.1fs for the rate limit", mode, url, waited)
+        # Les commandes passent avant les relectures en attente d'un slot
+        priority = PRIORITY_INTERACTIVE if write else request_priority.get()
+        await self._request_gate.async_acquire(priority)
+        try:
+            return await self._async_send_request(mode, url, headers, params, json)
+        finally:
+            self._request_gate.release()
+
+    async def _async_send_request(self, mode, url, headers, params, json):
         if headers is None:
             headers = {
                 "Authorization": "Bearer {}".format(self.token),
                 "Content-Type": "application/json",
             }
-        async with httpx.AsyncClient() as client:
-            if mode == "post":
-                r = await client.post(url=url, headers=headers, json=json)
-            if mode == "put":
-                r = await client.put(url=url, headers=headers, json=json)
-            elif mode == "delete":
-                r = await client.delete(url=url, headers=headers)
-            elif mode == "get":
-                r = await client.get(url=url, headers=headers, params=params)
-            elif mode == "patch":
-                _LOGGER.warning(url)
-                _LOGGER.warning(headers)
-                _LOGGER.warning(json)
-                r = await client.patch(url=url, headers=headers, json=json)
-            r.raise_for_status()
-            return r.json()
+        client = self._session
+        if mode == "post":
+            r = await client.post(url=url, headers=headers, json=json)
+        elif mode == "put":
+            r = await client.put(url=url, headers=headers, json=json)
+        elif mode == "delete":
+            r = await client.delete(url=url, headers=headers)
+        elif mode == "get":
+            r = await client.get(url=url, headers=headers, params=params)
+        elif mode == "patch":
+            _LOGGER.debug("PATCH %s : %s", url, json)
+            r = await client.patch(url=url, headers=headers, json=json)
+        return r
+
+    async def async_close(self):
+        """Stop token renewal and close the pooled HTTP session, if owned."""
+        if self._renew_handle is not None:
+            self._renew_handle.cancel()
+            self._renew_handle = None
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._owns_session:
+            await self._session.aclose()
 
     async def async_post(self, url, headers=None, json={}):
         return await self.async_request("post", url, headers, json=json)
@@ -112,7 +564,43 @@ class ComapClient (object):
         return await self.async_request("patch", url, headers, json=json)
 
     async def async_get(self, url, headers=None, params={}):
-        return await self.async_request("get", url, headers, params=params)
+        """GET an url, concurrent identical reads share the same request."""
+        if headers is not None:
+            return await self.async_request("get", url, headers, params=params)
+        _, content = await self._async_shared_get(url, params)
+        return jsonlib.loads(content)
+
+    async def async_get_changed(self, url, digest=None, params={}):
+        """GET an url, return (digest, payload).
+
+        payload is None, and the body is not parsed, when the body still
+        has the given digest.
+        """
+        new_digest, content = await self._async_shared_get(url, params)
+        if new_digest == digest:
+            return digest, None
+        return new_digest, jsonlib.loads(content)
+
+    async def _async_shared_get(self, url, params):
+        key = (url, tuple(sorted(params.items())))
+        request = self._inflight.get(key)
+        if request is None:
+            request = asyncio.ensure_future(self._async_get_body(url, params))
+            self._inflight[key] = request
+            request.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield : a cancelled caller must not cancel the other waiters
+        return await asyncio.shield(request)
+
+    async def _async_get_body(self, url, params):
+        r = await self._async_response("get", url, params=params)
+        return hashlib.blake2b(r.content, digest_size=16).digest(), r.content
+
+    async def async_get_endpoint(self, endpoint, digest=None, housing=None):
+        """Fetch one of the ENDPOINTS polled by the coordinator, see async_get_changed."""
+        if housing is None:
+            housing = self.housing
+        url = self._BASEURL + self.ENDPOINTS[endpoint].format(housing=housing)
+        return await self.async_get_changed(url, digest)
 
     async def async_delete(self, url, headers=None):
         return await self.async_request("delete", url, headers)
@@ -120,42 +608,14 @@ class ComapClient (object):
     async def async_put(self, url, headers=None, json={}):
         return await self.async_request("put", url, headers, json=json)
 
-    def token_refresh(self):
-        url = "https://cognito-idp.eu-west-3.amazonaws.com"
-
-        with _TOKEN_LOCK:
-            headers = {
-                "Content-Type": "application/x-amz-json-1.1",
-                "x-amz-target": "AWSCognitoIdentityProviderService.InitiateAuth",
-                "origin": "https://app.comapsmarthome.com",
-                "referer": "https://app.comapsmarthome.com",
-            }
-            payload = {
-                "AuthFlow": "REFRESH_TOKEN_AUTH",
-                "AuthParameters": {"REFRESH_TOKEN": self.refresh_token},
-                "ClientId": self.clientid,
-            }
-
-            login_request = httpx.post(url, json=payload, headers=headers)
-            if login_request.status_code == 200:
-                response = login_request.json()
-                self.last_request = datetime.now()
-                self.token = response.get("AuthenticationResult").get("AccessToken")
-                self.token_expires = response.get("AuthenticationResult").get(
-                    "ExpiresIn"
-                )
-            else:
-                _LOGGER.error("Refresh token failed")
-
-    def get_housings(self):
-        return self.get_request(self._BASEURL + "park/housings")
-    
     async def async_get_housings(self):
         return await self.async_get(self._BASEURL + "park/housings")
     
-    async def async_gethousing_data(self):
-        housings = await self.async_get_housings()
-        return housings[0]
+    async def async_gethousing_data(self, housing=None):
+        if housing is None:
+            housing = self.housing
+        self.housings = await self.async_get_housings()
+        return self.get_housing_data(housing)
 
     async def get_zones(self, housing=None):
         if housing is None:
@@ -171,10 +631,10 @@ class ComapClient (object):
             self._BASEURL + "thermal/housings/" + housing + "/thermal-details"
         )
 
-    def get_zone(self, zoneid, housing=None):
+    async def get_zone(self, zoneid, housing=None):
         if housing is None:
             housing = self.housing
-        return self.get_request(
+        return await self.async_get(
             self._BASEURL
             + "thermal/housings/"
             + housing
@@ -186,7 +646,7 @@ class ComapClient (object):
         """Get a list of all objects in the specified housing"""
         if housing is None:
             housing = self.housing
-        return self.get_request(
+        return await self.async_get(
             self._BASEURL
             + "park/housings/"
             + housing
@@ -198,14 +658,14 @@ class ComapClient (object):
             housing = self.housing
         """Get eligible zones for specified object"""
         try:
-            return self.get_request(
-            self._BASEURL
-            + "thermal/housings/"
-            + housing
-            + "/eligible-zones/"
-            + serial
-        )
-        except:
+            return await self.async_get(
+                self._BASEURL
+                + "thermal/housings/"
+                + housing
+                + "/eligible-zones/"
+                + serial
+            )
+        except httpx.HTTPError:
             return None
 
     async def set_holiday(self, housing=None):
@@ -356,33 +816,54 @@ class ComapClient (object):
             json=data,
         )
 
+    def _temporary_instruction_url(self, zone, housing):
+        return (
+            self._BASEURL
+            + "thermal/housings/"
+            + housing
+            + "/thermal-control/zones/"
+            + zone
+            + "/temporary-instruction"
+        )
+
     async def set_temporary_instruction(
-        self, zone, instruction, duration=120, housing=None
+        self, zone, instruction, duration=120, housing=None, replace=False
     ):
-        """Set a temporary instruction for a zone, for a given duration in minutes."""
+        """Set a temporary instruction for a zone, for a given duration in minutes.
+
+        With replace, the running instruction of the zone is removed first
+        instead of waiting for the API to refuse the new one.
+        """
         if housing is None:
             housing = self.housing
+        url = self._temporary_instruction_url(zone, housing)
         data = {"duration": duration, "set_point": {"instruction": instruction}}
 
+        self.instruction_stats["sent"] += 1
+        if replace:
+            self.instruction_stats["replaced"] += 1
+            await self._async_delete_temporary_instruction(url)
+        conflicts = 0
+        while True:
+            try:
+                return await self.async_post(url, json=data)
+            except httpx.HTTPStatusError as err:
+                if err.response.status_code != 409 or conflicts >= MAX_CONFLICT_RETRIES:
+                    raise
+                # Consigne posée ailleurs (application, autre client) : retirée
+                # puis renvoyée, une fois
+                conflicts += 1
+                self.instruction_stats["conflicts"] += 1
+                _LOGGER.debug("Zone %s already has a temporary instruction, replacing it", zone)
+                await self._async_delete_temporary_instruction(url)
+
+    async def _async_delete_temporary_instruction(self, url):
         try:
-            r = await self.async_post(
-                self._BASEURL
-                + "thermal/housings/"
-                + housing
-                + "/thermal-control/zones/"
-                + zone
-                + "/temporary-instruction",
-                json=data,
-            )
-            return r
+            await self.async_delete(url)
         except httpx.HTTPStatusError as err:
-            if err.response.status_code == 409:
-                await self.remove_temporary_instruction(zone, housing)
-                return await self.set_temporary_instruction(
-                    zone, instruction, duration=duration, housing=housing
-                )
-            else:
-                raise err
+            # Already ended
+            if err.response.status_code != 404:
+                raise
 
     async def remove_temporary_instruction(self, zone, housing=None):
         """Set a temporary instruction for a zone, for a given duration in minutes."""
@@ -390,14 +871,7 @@ class ComapClient (object):
             housing = self.housing
 
         try:
-            r = await self.async_delete(
-                self._BASEURL
-                + "thermal/housings/"
-                + housing
-                + "/thermal-control/zones/"
-                + zone
-                + "/temporary-instruction",
-            )
+            r = await self.async_delete(self._temporary_instruction_url(zone, housing))
             return r
         except httpx.HTTPStatusError as err:
             _LOGGER.error(err)
@@ -431,5 +905,9 @@ class ComapClientException(Exception):
     """Exception with ComapSmartHome client."""
 
 
-class ComapClientAuthException(Exception):
-    """Exception with ComapSmartHome client."""
\ No newline at end of file
+class ComapClientAuthException(ComapClientException):
+    """Exception with ComapSmartHome client."""
+
+
+class ComapCircuitOpenException(ComapClientException):
+    """Endpoint skipped after repeated failures."""
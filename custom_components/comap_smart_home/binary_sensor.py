@@ -6,12 +6,13 @@ from homeassistant.components.binary_sensor import (
 )
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN, COMAP_PRESENCE_INTERVAL
 from .comap_functions import get_zone_infos, build_name
+from .timeline import PointInTimeCallback, parse_time
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -19,21 +20,17 @@ async def async_setup_entry(
     async_add_entities,
 ) -> None:
 
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
-
-    zones = coordinator.data["thermal_details"].get("zones")
+    coordinators = hass.data[DOMAIN][config_entry.entry_id]["coordinators"]
 
     entities = list()
-    for zone in zones:
-        if (
-            "last_presence_detected" in zone.keys()
-            and zone["last_presence_detected"] != None
-        ):
-            entities.append(
-                ComapPresenceSensor(
-                    coordinator=coordinator, zone_id=zone.get("id"), zone_name=zone.get("title"), config_entry=config_entry
+    for coordinator in coordinators.values():
+        for zone in coordinator.data.zones.values():
+            if zone.last_presence_detected is not None:
+                entities.append(
+                    ComapPresenceSensor(
+                        coordinator=coordinator, zone_id=zone.id, zone_name=zone.title, config_entry=config_entry
+                    )
                 )
-            )
     # entities: entities
     async_add_entities(entities)
 
@@ -46,12 +43,42 @@ class ComapPresenceSensor(CoordinatorEntity,BinarySensorEntity):
         self.config_entry = config_entry  # Config entry pour accéder aux options
         self._attr_device_class = BinarySensorDeviceClass.OCCUPANCY
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             zone_name=zone_name,
             entity_name="Presence"
         )
-        self._id = coordinator.data["housing"].get("id") + "_" + zone_id + "_presence"
+        self._id = coordinator.data.housing.id + "_" + zone_id + "_presence"
         self._is_on = None
+        # Passe à "absent" à l'heure exacte, sans attendre la relecture suivante
+        self._expiry = PointInTimeCallback(coordinator.hass, self._async_expired)
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._schedule_expiry()
+        self.async_on_remove(self._expiry.cancel)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._schedule_expiry()
+        super()._handle_coordinator_update()
+
+    @callback
+    def _schedule_expiry(self):
+        zone = get_zone_infos(self.zone_id, self.coordinator.data)
+        presence = None if zone is None else parse_time(zone.last_presence_detected)
+        expires_at = None if presence is None else presence + self._presence_interval()
+        if expires_at is None or expires_at <= datetime.now(timezone.utc):
+            self._expiry.cancel()
+            return
+        self._expiry.schedule(expires_at)
+
+    @callback
+    def _async_expired(self, now):
+        self.async_write_ha_state()
+
+    def _presence_interval(self):
+        presence_interval = self.config_entry.options.get(COMAP_PRESENCE_INTERVAL, 60)
+        return timedelta(minutes=presence_interval)
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -77,16 +104,14 @@ class ComapPresenceSensor(CoordinatorEntity,BinarySensorEntity):
 
     @property
     def is_on(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone = get_zone_infos(self.zone_id, thermal_details)
-        last_presence_detected = zone.get("last_presence_detected")
+        zone = get_zone_infos(self.zone_id, self.coordinator.data)
+        last_presence_detected = zone.last_presence_detected
         return self.is_occupied(last_presence_detected)
 
     @property
     def extra_state_attributes(self) -> dict:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone = get_zone_infos(self.zone_id, thermal_details)
-        last_presence_detected = zone.get("last_presence_detected")
+        zone = get_zone_infos(self.zone_id, self.coordinator.data)
+        last_presence_detected = zone.last_presence_detected
         return {
             "last_presence_detected": last_presence_detected,
             "presence_interval": self.config_entry.options.get(COMAP_PRESENCE_INTERVAL)
@@ -95,7 +120,7 @@ class ComapPresenceSensor(CoordinatorEntity,BinarySensorEntity):
 
     def is_occupied(self, timestamp):
         now = datetime.now(timezone.utc)
-        presence = datetime.fromisoformat(timestamp)
-        presence_interval = self.config_entry.options.get(COMAP_PRESENCE_INTERVAL, 60)
-        interval_timedelta = timedelta(minutes=presence_interval)
-        return now - presence < interval_timedelta
\ No newline at end of file
+        presence = parse_time(timestamp)
+        if presence is None:
+            return False
+        return now - presence < self._presence_interval()
\ No newline at end of file
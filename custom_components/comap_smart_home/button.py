@@ -20,19 +20,21 @@ async def async_setup_entry(
     async_add_entities,
 ) -> None:
     
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
-    async_add_entities([RefreshButton(coordinator)])
+    coordinators = hass.data[DOMAIN][config_entry.entry_id]["coordinators"]
+    async_add_entities([
+        RefreshButton(coordinator) for coordinator in coordinators.values()
+    ])
 
 class RefreshButton(ButtonEntity, CoordinatorEntity):
     def __init__(self, coordinator):
         super().__init__(coordinator)
         self.coordinator = coordinator
         self._attr_name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             entity_name=" Refresh data button"
         )
-        self.housing = coordinator.data["housing"].get("id")
-        self.device_name = coordinator.data["housing"].get("name")
+        self.housing = coordinator.data.housing.id
+        self.device_name = coordinator.data.housing.name
         self._unique_id = self.housing + "refresh"
 
     @property
@@ -46,12 +48,13 @@ class RefreshButton(ButtonEntity, CoordinatorEntity):
         return DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.coordinator.data["housing"].get("id"))
+                (DOMAIN, self.coordinator.data.housing.id)
             },
-            name = self.coordinator.data["housing"].get("name"),
+            name = self.coordinator.data.housing.name,
             manufacturer="comap",
         )
     
     async def async_press(self):
         """Appelée lorsque le bouton est pressé."""
+        self.coordinator.mark_stale()
         await self.coordinator.async_request_refresh()
\ No newline at end of file
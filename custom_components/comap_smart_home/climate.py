@@ -1,5 +1,4 @@
 import logging
-from typing import Any
 
 from bidict import bidict
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
@@ -18,15 +17,10 @@ from homeassistant.components.climate.const import (
 )
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import (
-    CONF_PASSWORD,
-    CONF_USERNAME,
-    UnitOfTemperature,
-)
-from homeassistant.core import HomeAssistant
+from homeassistant.const import UnitOfTemperature
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.device_registry import DeviceInfo
 
-from .api import ComapClient
 from .const import DOMAIN
 from .comap_functions import get_zone_infos, build_name
 
@@ -61,21 +55,16 @@ async def async_setup_entry(
     async_add_entities,
 ):
     
-    config = config_entry.data
-    client = ComapClient(username=config[CONF_USERNAME], password=config[CONF_PASSWORD])
-
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    client = entry_data["client"]
+    coordinators = entry_data["coordinators"]
 
     assist_compatibility = False
 
-    housing_details = coordinator.data["thermal_details"]
-    heating_system_state = housing_details.get("heating_system_state")
-    for zone in housing_details.get("zones"):
-        zone.update({"heating_system_state": heating_system_state})
-
     zones = [
         ComapZoneThermostat(hass, coordinator, client, zone, assist_compatibility)
-        for zone in housing_details.get("zones")
+        for coordinator in coordinators.values()
+        for zone in coordinator.data.zones.values()
     ]
 
     async_add_entities(zones)
@@ -106,14 +95,14 @@ class ComapZoneThermostat(CoordinatorEntity,ClimateEntity):
         if not assist_compatibility:
             self._attr_hvac_modes.append(HVACMode.AUTO)
         self.client = client
-        self.zone_id = zone.get("id")
-        self.zone_name = coordinator.data["housing"].get("name") + " " + zone.get("title")
+        self.zone_id = zone.id
+        self.zone_name = coordinator.data.housing.name + " " + zone.title
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
-            zone_name = zone.get("title"),
+            housing_name=coordinator.data.housing.name,
+            zone_name = zone.title,
             entity_name="Thermostat"
         )
-        self.set_point_type = zone.get("set_point_type")
+        self.set_point_type = zone.set_point_type
         if (self.set_point_type == "custom_temperature") | (
             self.set_point_type == "defined_temperature"
         ):
@@ -126,6 +115,8 @@ class ComapZoneThermostat(CoordinatorEntity,ClimateEntity):
             self._attr_supported_features = ClimateEntityFeature.PRESET_MODE
         self._enable_turn_on_off_backwards_compatibility = False
         self.choosen_thermo_preset = None
+        self._derived_key = None
+        self._update_from_snapshot(coordinator.data)
 
 #Données fixes
 
@@ -142,6 +133,11 @@ class ComapZoneThermostat(CoordinatorEntity,ClimateEntity):
             serial_number = self.zone_id
         )
 
+    @property
+    def available(self) -> bool:
+        """Unavailable once the zone is gone from the housing."""
+        return super().available and self.zone_id in self.coordinator.data.zones
+
     @property
     def name(self) -> str:
         """Return the name of the entity."""
@@ -154,127 +150,95 @@ class ComapZoneThermostat(CoordinatorEntity,ClimateEntity):
 
 #Données variables
 
-    @property
-    def current_temperature(self) -> float:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        return zone_data.get("temperature")
-    
-    @property
-    def target_temperature(self) -> float:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        target_temp = None
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Recompute the zone state once per coordinator update."""
+        self._update_from_snapshot(self.coordinator.data)
+        super()._handle_coordinator_update()
+
+    def _update_from_snapshot(self, snapshot):
+        zone_data = get_zone_infos(self.zone_id, snapshot)
+        if zone_data is None:
+            return
+        # Le snapshot est immuable : rien à recalculer si la zone, l'état du
+        # chauffage et les températures sont inchangés
+        key = (zone_data, snapshot.heating_system_state, snapshot.temperatures)
+        if key == self._derived_key and self.choosen_thermo_preset is None:
+            return
+        self._derived_key = key
+
+        self._attr_current_temperature = zone_data.temperature
+        self._attr_current_humidity = zone_data.humidity
+        self._attr_target_temperature = None
         if self.zone_type == "thermostat":
-            target_temp = self.get_target_temperature(zone_data.get("set_point").get("instruction"), zone_data.get("set_point_type"))
-        return target_temp
-            
-    @property
-    def current_humidity(self) -> int:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        return zone_data.get("humidity")
-
-    @property
-    def hvac_mode(self) -> HVACMode:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        return self.map_hvac_mode(zone_data)
-    
-    @property
-    def hvac_action(self) -> HVACAction:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        return self.map_hvac_action(zone_data)
-
-    @property
-    def preset_mode(self) -> str | None:
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        preset_mode = None
-        if self.zone_type == "pilot_wire":
-            preset_mode = self.map_preset_mode(
-                zone_data.get("set_point").get("instruction")
+            self._attr_target_temperature = self.get_target_temperature(
+                zone_data.instruction, zone_data.set_point_type, snapshot.temperatures
             )
+        self._attr_hvac_mode = self.map_hvac_mode(zone_data, snapshot.heating_system_state)
+        self._attr_hvac_action = self.map_hvac_action(zone_data, snapshot.heating_system_state)
+        if self.zone_type == "pilot_wire":
+            self._attr_preset_mode = self.map_preset_mode(zone_data.instruction)
         else:
-            preset_mode = self.map_thermo_preset_mode(
-                zone_data.get("set_point").get("instruction")
-            )
+            self._attr_preset_mode = self.map_thermo_preset_mode(zone_data.instruction)
             self.choosen_thermo_preset = None
-        return preset_mode
-
-    @property
-    def extra_state_attributes(self) -> dict[str, Any] | None:
-        attrs = {}
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        next_timeslot = zone_data["next_timeslot"]
-        attrs["next_timeslot"] = next_timeslot["begin_at"]
-        attrs["next_instruction"] = next_timeslot["set_point"]["instruction"]
-        attrs["zone_id"] = self.zone_id
-        return attrs
-    
+        self._attr_extra_state_attributes = {
+            "next_timeslot": zone_data.next_timeslot_begin_at,
+            "next_instruction": zone_data.next_instruction,
+            "zone_id": self.zone_id,
+        }
 
     async def async_set_preset_mode(self, preset_mode: str) -> None:
         tempo = self.hass.data[self.zone_id + "_tempo_duration"]
         if self.set_point_type == "pilot_wire":
-            await self.client.set_temporary_instruction(
+            await self.coordinator.async_set_temporary_instruction(
                 self.zone_id, self.map_comap_mode(preset_mode), tempo
             )
         else:
             if preset_mode == PRESET_AWAY:
-                await self.client.set_absence()
+                await self.coordinator.async_set_absence(True)
             else:
                 temperature = self.get_comap_temperature(preset_mode)
                 self.choosen_thermo_preset = preset_mode
                 if temperature is None:
                     return
-                await self.client.set_temporary_instruction(
+                await self.coordinator.async_set_temporary_instruction(
                     self.zone_id, temperature, tempo
                 )
-        await self.coordinator.async_request_refresh()
 
     async def async_reset_temporary (self):
-        await self.client.remove_temporary_instruction(self.zone_id)
+        await self.coordinator.async_remove_temporary_instruction(self.zone_id)
 
     async def async_set_hvac_mode(self, hvac_mode: str) -> bool:
         """Set new hvac mode."""
 
         if (hvac_mode == HVACMode.AUTO):
             await self.async_reset_temporary()
-            await self.coordinator.async_request_refresh()
         elif (hvac_mode == HVACMode.OFF) & (self.zone_type == "pilot_wire"):
             await self.async_set_preset_mode("off")
-            await self.coordinator.async_request_refresh()
         elif (hvac_mode == HVACMode.HEAT) & (self.zone_type == "pilot_wire"):
             await self.async_set_preset_mode(PRESET_COMFORT)
-            await self.coordinator.async_request_refresh()
         elif (hvac_mode == HVACMode.OFF) & (self.zone_type == "thermostat"):
-            await self.client.set_temporary_instruction(self.zone_id, 7)
-            await self.coordinator.async_request_refresh()
+            await self.coordinator.async_set_temporary_instruction(self.zone_id, 7)
         elif (hvac_mode == HVACMode.HEAT) & (self.zone_type == "thermostat"):
-            await self.client.set_temporary_instruction(self.zone_id, 20)
-            await self.coordinator.async_request_refresh()
+            await self.coordinator.async_set_temporary_instruction(self.zone_id, 20)
 
     async def async_set_temperature(self, **kwargs) -> None:
         self.choosen_thermo_preset = None
         tempo = self.hass.data[self.zone_id + "_tempo_duration"]
-        await self.client.set_temporary_instruction(self.zone_id, kwargs["temperature"],tempo)
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_temporary_instruction(self.zone_id, kwargs["temperature"],tempo)
 
     def get_comap_used_presets(self):
-        comap_temperatures = self.coordinator.data["comap_temperatures"]
+        presets = self.coordinator.data.temperatures.presets
         used_presets = []
-        for temperature in comap_temperatures:
-            if not temperature["value"] is None:
-                used_presets.append(PRESET_THERMO_MODE_MAP.get(temperature["id"]))
+        for preset in presets.values():
+            if not preset.value is None:
+                used_presets.append(PRESET_THERMO_MODE_MAP.get(preset.id))
         return used_presets
     
 
-    def map_hvac_mode(self, zone_data):
-        heating_system_state = zone_data.get("heating_system_state")
-        type = zone_data.get("set_point_type")
-        temporary_instruction = zone_data.get("events").get("temporary_instruction")
+    def map_hvac_mode(self, zone_data, heating_system_state):
+        type = zone_data.set_point_type
+        temporary_instruction = zone_data.temporary_instruction
         if temporary_instruction is None:
             hvac_mode_map = {"off": HVACMode.OFF, "on": HVACMode.AUTO}
             if self._assist_compatibility is True:
@@ -289,9 +253,8 @@ class ComapZoneThermostat(CoordinatorEntity,ClimateEntity):
         else:
             return HVACMode.HEAT
         
-    def map_hvac_action(self, zone_data):
-        heating_status = zone_data.get("heating_status")
-        heating_system_state = zone_data.get("heating_system_state")
+    def map_hvac_action(self, zone_data, heating_system_state):
+        heating_status = zone_data.heating_status
         if heating_system_state == "off":
             return HVACAction.OFF
         hvac_action_map = {"cooling": HVACAction.IDLE, "heating": HVACAction.HEATING}
@@ -313,30 +276,17 @@ class ComapZoneThermostat(CoordinatorEntity,ClimateEntity):
         return PRESET_MODE_MAP.inverse[ha_mode]
     
     def get_comap_temperature(self, ha_mode):
-        comap_temperatures = self.coordinator.data["comap_temperatures"]
         comap_preset = PRESET_THERMO_MODE_MAP.inverse[ha_mode]
-        for temperature in comap_temperatures:
-            if temperature["id"] == comap_preset:
-                return temperature["value"]
-        return None
+        preset = self.coordinator.data.temperatures.presets.get(comap_preset)
+        if preset is None:
+            return None
+        return preset.value
 
-    def get_target_temperature(self, instruction, set_point_type):
+    def get_target_temperature(self, instruction, set_point_type, temperatures):
         target_temperature = None
-        if set_point_type == "custom_temperature":
+        if set_point_type == "custom_temperature" or isinstance(instruction, (int, float)):
+            # Une consigne temporaire est une température
             target_temperature = instruction
         elif set_point_type == "defined_temperature":
-            try:
-                temperatures = self.coordinator.data["temperatures"]
-                if instruction in temperatures:
-                    target_temperature = temperatures[instruction]
-                elif instruction in temperatures["connected"]:
-                    target_temperature = temperatures["connected"][
-                        instruction
-                    ]
-                elif instruction in temperatures["smart"]:
-                    target_temperature = temperatures["smart"][instruction]
-                else:
-                    target_temperature = 0
-            except:
-                target_temperature = 0
+            target_temperature = temperatures.values.get(instruction, 0)
         return target_temperature
@@ -6,54 +6,20 @@ def get_now():
     return datetime.now(tz=time_zone).isoformat()
 
 
-def get_connected_object_zone_infos(object_sn, thermal_details):
-    zones = thermal_details.get("zones")
-    zone_id = None
-    zone_title = None
-    for zone in zones:
-        zone_obj = zone.get("connected_objects")
-        for obj_serial in zone_obj:
-            if obj_serial == object_sn:
-                zone_title = zone.get("title")
-                zone_id = zone.get("id")
+def get_connected_object_zone_infos(object_sn, snapshot):
+    zone = snapshot.zone_by_serial.get(object_sn)
+    if zone is None:
+        return {"id": None, "title": None}
     return {
-        "id": zone_id,
-        "title": zone_title
+        "id": zone.id,
+        "title": zone.title
     }
 
-def get_object_infos(serial_number,objects):
-    retour = None
-    for object in objects:
-        if object.get("serial_number") == serial_number:
-            retour = object
-            break
-    return retour
+def get_object_infos(serial_number, snapshot):
+    return snapshot.objects.get(serial_number)
 
-def get_zone_infos(zone_id,thermal_details):
-    retour = None
-    zones = thermal_details.get("zones")
-    for zone in zones:
-        if zone.get("id") == zone_id:
-            retour = zone
-            break
-    return retour
-
-def find_in_array(key_id,key_value,array_of_objects):
-    r = None
-    for object in array_of_objects:
-        if object.get(key_id) == key_value:
-            r = object
-            break
-    return r
-
-def filter_an_array(key_id,key_value,array_of_objects):
-    r = None
-    for object in array_of_objects:
-        if object.get(key_id) == key_value:
-            if r is None:
-                r = []
-            r.append(object)
-    return r
+def get_zone_infos(zone_id, snapshot):
+    return snapshot.zones.get(zone_id)
 
 def DateToHHMM (date_str):
     time_zone = ZoneInfo("Europe/Paris")
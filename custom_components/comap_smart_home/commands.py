@@ -0,0 +1,86 @@
+"""Coalescing and ordering of the write commands sent to the Comap API."""
+
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ZoneWriteCoalescer:
+    """Send only the last write requested for a zone within a short window.
+
+    Each call replaces the pending write of its zone and restarts the
+    window. When the window expires the last write is awaited once, and
+    every call of the window returns with it. Only the last caller gets its
+    error : the superseded calls just return.
+
+    Writes to one zone go through its lane and never overlap, whereas
+    different zones are written in parallel.
+    """
+
+    def __init__(self, hass: HomeAssistant, delay):
+        self.hass = hass
+        self.delay = delay
+        # zone id -> (write, args, timer handle, futures of the callers)
+        self._pending = {}
+        # zone id -> asyncio.Lock
+        self._lanes = {}
+
+    def lane(self, zone_id):
+        """Lock ordering the writes sent to a zone."""
+        lane = self._lanes.get(zone_id)
+        if lane is None:
+            lane = self._lanes[zone_id] = asyncio.Lock()
+        return lane
+
+    def pending(self, zone_id):
+        """Whether a write of the zone waits for its window to expire."""
+        return zone_id in self._pending
+
+    async def async_request(self, zone_id, write, *args):
+        future = self.hass.loop.create_future()
+        waiters = [future]
+        pending = self._pending.pop(zone_id, None)
+        if pending is not None:
+            _, _, handle, waiters = pending
+            handle.cancel()
+            waiters.append(future)
+        handle = self.hass.loop.call_later(self.delay, self._flush, zone_id)
+        self._pending[zone_id] = (write, args, handle, waiters)
+        return await future
+
+    @callback
+    def _flush(self, zone_id):
+        write, args, _, waiters = self._pending.pop(zone_id)
+        self.hass.async_create_task(self._async_send(zone_id, write, args, waiters))
+
+    async def _async_send(self, zone_id, write, args, waiters):
+        if len(waiters) > 1:
+            _LOGGER.debug("Zone %s : %s writes coalesced", zone_id, len(waiters))
+        *superseded, last = waiters
+        try:
+            # L'écriture précédente de la zone peut encore être en cours
+            async with self.lane(zone_id):
+                result = await write(zone_id, *args)
+        except Exception as err:  # pylint: disable=broad-except
+            _resolve(superseded, None)
+            if not last.done():
+                last.set_exception(err)
+            return
+        _resolve(waiters, result)
+
+    def cancel(self):
+        """Drop the pending writes, on unload."""
+        for _, _, handle, waiters in self._pending.values():
+            handle.cancel()
+            for future in waiters:
+                future.cancel()
+        self._pending.clear()
+
+
+def _resolve(futures, result):
+    for future in futures:
+        if not future.done():
+            future.set_result(result)
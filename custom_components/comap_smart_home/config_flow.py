@@ -1,20 +1,23 @@
 """Config flow to configure Comap smart home."""
 import logging
 
-from .api import ComapClient, ComapClientException
+from .api import ComapClient, ComapClientException, DEFAULT_RATE_LIMIT, MAX_RATE_LIMIT
+import httpx
 import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.core import callback
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.helpers.httpx_client import get_async_client
 
-from .const import DOMAIN, COMAP_SENSOR_SCAN_INTERVAL, COMAP_PRESENCE_INTERVAL
+from .const import DOMAIN, COMAP_SENSOR_SCAN_INTERVAL, COMAP_SLOW_SCAN_INTERVAL, COMAP_PRESENCE_INTERVAL, COMAP_WRITE_DELAY, COMAP_MIN_SCAN_INTERVAL, COMAP_MAX_SCAN_INTERVAL, COMAP_RATE_LIMIT
 
 
 DATA_SCHEMA = vol.Schema({
     vol.Required(CONF_USERNAME): str,
     vol.Required(CONF_PASSWORD): str,
     vol.Required(COMAP_SENSOR_SCAN_INTERVAL, default=5): vol.All(int, vol.Clamp(min=1, max=30)),
+    vol.Required(COMAP_SLOW_SCAN_INTERVAL, default=60): vol.All(int, vol.Clamp(min=5, max=1440)),
     vol.Required(COMAP_PRESENCE_INTERVAL, default=60): vol.All(int, vol.Clamp(min=1, max=240)),
     
 })
@@ -34,9 +37,14 @@ class ComapFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 self._async_abort_entries_match(
                     {CONF_USERNAME: user_input[CONF_USERNAME]}
                 )
-                client = ComapClient(username=user_input[CONF_USERNAME],password=user_input[CONF_PASSWORD])
+                client = await ComapClient.async_create(
+                    username=user_input[CONF_USERNAME],
+                    password=user_input[CONF_PASSWORD],
+                    session=get_async_client(self.hass),
+                )
+                await client.async_close()
 
-            except ComapClientException:
+            except (ComapClientException, httpx.HTTPError):
                 errors["base"] = "cannot_connect"
             else:
                 return self.async_create_entry(
@@ -44,6 +52,7 @@ class ComapFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                     data=user_input,
                     options={
                         COMAP_SENSOR_SCAN_INTERVAL: user_input.get(COMAP_SENSOR_SCAN_INTERVAL, 5),
+                        COMAP_SLOW_SCAN_INTERVAL: user_input.get(COMAP_SLOW_SCAN_INTERVAL, 60),
                         COMAP_PRESENCE_INTERVAL: user_input.get(COMAP_PRESENCE_INTERVAL, 60),
                     }
                 )
@@ -77,10 +86,20 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
         # Obtenir la valeur actuelle ou utiliser la valeur par défaut
         current_sensor_interval_value = self.config_entry.options.get(COMAP_SENSOR_SCAN_INTERVAL, self.config_entry.data.get(COMAP_SENSOR_SCAN_INTERVAL, 5))
+        current_slow_interval_value = self.config_entry.options.get(COMAP_SLOW_SCAN_INTERVAL, self.config_entry.data.get(COMAP_SLOW_SCAN_INTERVAL, 60))
+        current_min_interval_value = self.config_entry.options.get(COMAP_MIN_SCAN_INTERVAL, 1)
+        current_max_interval_value = self.config_entry.options.get(COMAP_MAX_SCAN_INTERVAL, 30)
         current_presence_interval_value = self.config_entry.options.get(COMAP_PRESENCE_INTERVAL, self.config_entry.data.get(COMAP_PRESENCE_INTERVAL, 60))
+        current_write_delay_value = self.config_entry.options.get(COMAP_WRITE_DELAY, 1.0)
+        current_rate_limit_value = self.config_entry.options.get(COMAP_RATE_LIMIT, DEFAULT_RATE_LIMIT)
         data_schema = vol.Schema({
             vol.Required(COMAP_SENSOR_SCAN_INTERVAL, default=current_sensor_interval_value): vol.All(int, vol.Clamp(min=1, max=30)),
+            vol.Required(COMAP_SLOW_SCAN_INTERVAL, default=current_slow_interval_value): vol.All(int, vol.Clamp(min=5, max=1440)),
+            vol.Required(COMAP_MIN_SCAN_INTERVAL, default=current_min_interval_value): vol.All(int, vol.Clamp(min=1, max=30)),
+            vol.Required(COMAP_MAX_SCAN_INTERVAL, default=current_max_interval_value): vol.All(int, vol.Clamp(min=5, max=240)),
             vol.Required(COMAP_PRESENCE_INTERVAL, default=current_presence_interval_value): vol.All(int, vol.Clamp(min=1, max=240)),
+            vol.Required(COMAP_WRITE_DELAY, default=current_write_delay_value): vol.All(vol.Coerce(float), vol.Clamp(min=0, max=10)),
+            vol.Required(COMAP_RATE_LIMIT, default=current_rate_limit_value): vol.All(int, vol.Clamp(min=10, max=MAX_RATE_LIMIT)),
         })
 
         return self.async_show_form(step_id="user", data_schema=data_schema, errors=errors)
\ No newline at end of file
@@ -7,4 +7,10 @@ SERVICE_SET_HOME = "set_home"
 SERVICE_SET_SCHEDULE = "set_schedule"
 ATTR_SCHEDULE_NAME = "schedule_name"
 COMAP_SENSOR_SCAN_INTERVAL = "comap_sensor_scan_interval"
-COMAP_PRESENCE_INTERVAL = "comap_presence_interval"
\ No newline at end of file
+COMAP_SLOW_SCAN_INTERVAL = "comap_slow_scan_interval"
+COMAP_MIN_SCAN_INTERVAL = "comap_min_scan_interval"
+COMAP_MAX_SCAN_INTERVAL = "comap_max_scan_interval"
+COMAP_PRESENCE_INTERVAL = "comap_presence_interval"
+COMAP_WRITE_DELAY = "comap_write_delay"
+COMAP_RATE_LIMIT = "comap_rate_limit"
+STORAGE_VERSION = 1
@@ -0,0 +1,533 @@
+"""Data update coordinator for Comap Smart Home."""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .api import PRIORITY_BACKGROUND, PRIORITY_BULK, ComapClient, request_priority
+from .commands import ZoneWriteCoalescer
+from .model import Zone, build_snapshot, empty_fields, parse_section
+from .timeline import (
+    PointInTimeCallback,
+    event_end,
+    first_boundary,
+    has_temporary_instruction,
+    next_boundary,
+    project_snapshot,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Données qui changent en permanence, relues à chaque cycle
+FAST_SECTIONS = ("thermal_details", "connected_objects")
+# Données quasi statiques, relues selon l'intervalle lent
+SLOW_SECTIONS = ("housing", "temperatures", "programs", "schedules")
+ALL_SECTIONS = FAST_SECTIONS + SLOW_SECTIONS
+# Fenêtre de regroupement des relectures après écriture (secondes)
+REFRESH_COOLDOWN = 2
+# Relecture juste après un changement de créneau, le temps que l'API le
+# reflète, plus un délai propre à chaque logement : les créneaux tombent
+# aux heures rondes pour tout le monde
+BOUNDARY_DELAY = timedelta(seconds=30)
+BOUNDARY_JITTER = 60
+# Dernières données servies telles quelles pendant une panne de l'API, au plus
+STALE_DATA_MAX_AGE = timedelta(hours=1)
+
+
+class ComapCoordinator(DataUpdateCoordinator):
+    """Poll the Comap endpoints of one housing in a fast and a slow tier.
+
+    data is a ComapSnapshot, replaced as a whole after each refresh.
+    Writes go through the async_set_* methods : the expected result is
+    applied to the snapshot at once, then a background refresh reconciles
+    it with the server.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: ComapClient,
+        housing_id,
+        update_interval,
+        slow_update_interval,
+        write_delay=0,
+        min_update_interval=None,
+        max_update_interval=None,
+    ):
+        self._base_update_interval = update_interval
+        self.min_update_interval = min(min_update_interval or update_interval, update_interval)
+        self.max_update_interval = max(max_update_interval or update_interval, update_interval)
+        # Premier cycle décalé au hasard : les entrées démarrées ensemble
+        # ne sollicitent pas l'API en même temps à chaque cycle
+        self._phase = random.uniform(0.5, 1.5)
+        self._boundary_delay = BOUNDARY_DELAY + timedelta(seconds=random.uniform(0, BOUNDARY_JITTER))
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"Comap Smart Home Data {housing_id}",
+            update_interval=update_interval,
+            # Listeners are only notified when the data actually changed
+            always_update=False,
+        )
+        self.client = client
+        self.housing_id = housing_id
+        self.slow_update_interval = slow_update_interval
+        # Body digest, fetch time (monotonic) and parsed snapshot fields of
+        # each section ; raw payloads are not kept
+        self._digests = {}
+        self._fetched_at = {}
+        self._fields = empty_fields()
+        self._stale = set()
+        self._stale_zones = set()
+        self.data_updated_at = None
+        # section -> last error, for the sections serving their last good value
+        self.section_errors = {}
+        self._degraded = False
+        # Sections relues mais pas encore publiées (cycle servi en données
+        # anciennes) : le prochain cycle réussi reconstruit le snapshot
+        self._unpublished = False
+        # Heure (horloge de la boucle) du prochain cycle programmé
+        self._next_poll_at = None
+        # zone id -> whether the API holds a temporary instruction for the
+        # zone, read before the optimistic changes of its pending writes
+        self._server_instructions = {}
+        # Fins de consignes temporaires et changements de créneau, au plus juste
+        self._projection = PointInTimeCallback(hass, self._async_project)
+        # Un seul rafraîchissement pour toutes les écritures rapprochées
+        self._refresh_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=REFRESH_COOLDOWN,
+            immediate=False,
+            function=self._async_refresh_stale,
+        )
+        # Regroupe les consignes successives d'une zone (curseur, automatisations)
+        self.zone_writes = ZoneWriteCoalescer(hass, write_delay)
+        self._store_section("housing", None, client.get_housing_data(housing_id))
+
+    def _store_section(self, section, digest, payload):
+        """Keep a section, return False if its payload did not change."""
+        if payload is not None:
+            # Digest gardé seulement une fois la réponse comprise : sinon la
+            # même réponse passerait ensuite pour inchangée
+            fields = parse_section(section, payload)
+            self._digests[section] = digest
+            self._fields.update(fields)
+        self._fetched_at[section] = time.monotonic()
+        return payload is not None
+
+    def mark_stale(self, *sections):
+        """Refetch these sections (all if none given) on the next refresh."""
+        self._stale.update(sections or ALL_SECTIONS)
+
+    def _due_sections(self):
+        now = time.monotonic()
+        slow_interval = self.slow_update_interval.total_seconds()
+        due = set(FAST_SECTIONS) | self._stale
+        for section in SLOW_SECTIONS:
+            fetched_at = self._fetched_at.get(section)
+            if fetched_at is None or now - fetched_at >= slow_interval:
+                due.add(section)
+        return tuple(section for section in ALL_SECTIONS if section in due)
+
+    async def _async_fetch_section(self, section):
+        # Propre à la tâche de cette section : le tiers lent passe en dernier
+        request_priority.set(PRIORITY_BULK if section in SLOW_SECTIONS else PRIORITY_BACKGROUND)
+        digest, payload = await self.client.async_get_endpoint(
+            section, self._digests.get(section), self.housing_id
+        )
+        if section == "housing" and payload is not None:
+            self.client.housings = payload
+            payload = self.client.get_housing_data(self.housing_id)
+        return digest, payload
+
+    async def async_shutdown(self) -> None:
+        """Drop the pending writes and refreshes, on unload."""
+        self.zone_writes.cancel()
+        self._refresh_debouncer.async_cancel()
+        self._projection.cancel()
+        await super().async_shutdown()
+
+    async def _async_fetch_sections(self, sections):
+        """Fetch sections concurrently, each one on its own.
+
+        Return whether a section changed, and the errors of the failed ones.
+        These keep their last good value and stay stale.
+        """
+        results = await asyncio.gather(
+            *(self._async_fetch_section(section) for section in sections),
+            return_exceptions=True,
+        )
+        changed = False
+        errors = {}
+        for section, result in zip(sections, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                errors[section] = result
+                continue
+            try:
+                changed |= self._store_section(section, *result)
+            except Exception as err:  # pylint: disable=broad-except
+                # Réponse inattendue : même traitement qu'un échec de lecture
+                errors[section] = err
+                continue
+            self._stale.discard(section)
+            self.section_errors.pop(section, None)
+        self._stale.update(errors)
+        self.section_errors.update(errors)
+        return changed, errors
+
+    async def _async_update_data(self):
+        # Le logement est résolu une fois par le client : tous les autres
+        # appels n'en dépendent que par son id et partent en parallèle,
+        # chaque URL une seule fois par cycle
+        changed, errors = await self._async_fetch_sections(self._due_sections())
+        self._unpublished |= changed
+        if errors and self.data is None:
+            # Les plateformes créent leurs entités d'après la première lecture :
+            # elle doit être complète, Home Assistant réessaie sinon
+            section, err = next(iter(errors.items()))
+            raise UpdateFailed(f"Error fetching {section}: {err}") from err
+        if "thermal_details" in errors:
+            # Sans les zones, rien d'utile à publier
+            return self._stale_data(errors["thermal_details"])
+        for section, err in errors.items():
+            _LOGGER.debug("Keeping the last %s of housing %s : %s", section, self.housing_id, err)
+        self._stale_zones.clear()
+        self.data_updated_at = dt_util.utcnow()
+        if self._degraded:
+            _LOGGER.info("Comap housing %s reachable again", self.housing_id)
+            self._degraded = False
+
+        if not self._unpublished and self.data is not None:
+            # Rien n'a changé : même snapshot, aucune entité n'est notifiée
+            snapshot = self.data
+        else:
+            snapshot = build_snapshot(self._fields)
+            self._unpublished = False
+        self.update_interval = self._next_update_interval(snapshot)
+        return snapshot
+
+    def _stale_data(self, err):
+        """Keep serving the last snapshot while the API is degraded."""
+        if self.data is None or dt_util.utcnow() - self.data_updated_at > STALE_DATA_MAX_AGE:
+            raise UpdateFailed(f"Error fetching data: {err}") from err
+        if not self._degraded:
+            _LOGGER.warning(
+                "Error fetching Comap housing %s, keeping data from %s : %s",
+                self.housing_id,
+                self.data_updated_at,
+                err,
+            )
+            self._degraded = True
+        # Même snapshot : les entités restent disponibles, data_age avance
+        self.async_update_listeners()
+        return self.data
+
+    @property
+    def data_age(self):
+        """Seconds since the last successful poll."""
+        if self.data_updated_at is None:
+            return None
+        return round((dt_util.utcnow() - self.data_updated_at).total_seconds())
+
+    def _next_update_interval(self, snapshot):
+        """Poll right after the next known change, less often when none is expected."""
+        base = self._base_update_interval
+        now = dt_util.utcnow()
+        boundary = next_boundary(snapshot, now)
+        if snapshot.heating_system_state == "off":
+            interval = self.max_update_interval
+        elif has_temporary_instruction(snapshot):
+            interval = base / 2
+        elif boundary is None or boundary - now > self.max_update_interval:
+            interval = base * 2
+        else:
+            interval = base
+        if self._phase is not None:
+            interval *= self._phase
+            self._phase = None
+        if boundary is not None and snapshot.heating_system_state != "off":
+            interval = min(interval, boundary - now + self._boundary_delay)
+        return min(max(interval, self.min_update_interval), self.max_update_interval)
+
+    @callback
+    def _publish(self):
+        """Notify the entities of a new snapshot, polling sooner if it calls for it."""
+        self.data = build_snapshot(self._fields)
+        self._unpublished = False
+        self.async_update_listeners()
+        self._poll_sooner()
+
+    @callback
+    def _schedule_refresh(self) -> None:
+        super()._schedule_refresh()
+        if self.update_interval is not None:
+            self._next_poll_at = self.hass.loop.time() + self.update_interval.total_seconds()
+
+    @callback
+    def _poll_sooner(self):
+        """Bring the next poll forward if the published snapshot needs it.
+
+        A write or a projection can call for faster polling (heating back
+        on, temporary instruction set) : the poll already scheduled with the
+        previous interval is moved earlier, never later.
+        """
+        if self.update_interval is None:
+            return
+        self.update_interval = self._next_update_interval(self.data)
+        due_at = self.hass.loop.time() + self.update_interval.total_seconds()
+        if self._next_poll_at is not None and due_at < self._next_poll_at:
+            self._schedule_refresh()
+
+    @callback
+    def _apply(self, section, **fields):
+        """Publish an optimistic change of the fields of a section."""
+        # Le digest est oublié pour que la prochaine lecture de la section
+        # remplace la valeur supposée, même si le serveur n'a pas encore changé
+        self._digests.pop(section, None)
+        self._fields.update(fields)
+        self._publish()
+
+    @callback
+    def _apply_zone(self, zone_id, **changes):
+        zone = self._fields["zones"].get(zone_id)
+        if zone is None:
+            return
+        self._set_zones(replace(zone, **changes))
+
+    @callback
+    def _set_zones(self, *zones, **fields):
+        zone_by_serial = dict(self._fields["zone_by_serial"])
+        for zone in zones:
+            for obj_serial in zone.connected_objects:
+                zone_by_serial[obj_serial] = zone
+        self._apply(
+            "thermal_details",
+            zones={**self._fields["zones"], **{zone.id: zone for zone in zones}},
+            zone_by_serial=zone_by_serial,
+            **fields,
+        )
+
+    @callback
+    def async_update_listeners(self) -> None:
+        if self.data is not None:
+            self._projection.schedule(first_boundary(self.data))
+        super().async_update_listeners()
+
+    @callback
+    def _async_project(self, now):
+        """Apply the changes due by now to the snapshot, without API call."""
+        zones, fields = project_snapshot(self.data, now)
+        if zones or fields:
+            self._set_zones(*zones, **fields)
+
+    @callback
+    def async_schedule_refresh(self, *sections, zones=()):
+        """Refetch these sections and zones once the writes settled.
+
+        Requests made within the debounce window are merged into a single
+        refresh, which only reads what they made stale.
+        """
+        self._stale.update(sections)
+        self._stale_zones.update(zones)
+        self._refresh_debouncer.async_schedule_call()
+
+    async def _async_refresh_stale(self):
+        sections = tuple(section for section in ALL_SECTIONS if section in self._stale)
+        zones = tuple(self._stale_zones)
+        self._stale_zones.clear()
+        if len(zones) > 1 and "thermal_details" not in sections:
+            # Une seule requête pour plusieurs zones
+            sections += ("thermal_details",)
+        if "thermal_details" in sections:
+            zones = ()
+        (changed, errors), payloads = await asyncio.gather(
+            self._async_fetch_sections(sections),
+            asyncio.gather(
+                *(self.client.get_zone(zone_id, self.housing_id) for zone_id in zones),
+                return_exceptions=True,
+            ),
+        )
+        zones = []
+        for payload in payloads:
+            if isinstance(payload, Exception):
+                errors["zone"] = payload
+                # Relue au prochain cycle normal
+                self._stale.add("thermal_details")
+                continue
+            zone = Zone.from_json(payload)
+            if zone != self._fields["zones"].get(zone.id):
+                zones.append(zone)
+        if errors:
+            _LOGGER.debug("Refresh after write failed : %s", errors)
+        if zones:
+            self._set_zones(*zones)
+        elif changed:
+            self._publish()
+
+    @callback
+    def _note_server_instruction(self, zone_id):
+        if self.zone_writes.pending(zone_id):
+            # Le snapshot montre déjà la consigne supposée de la fenêtre
+            return
+        zone = self._fields["zones"].get(zone_id)
+        temporary_instruction = None if zone is None else zone.temporary_instruction
+        end = event_end(temporary_instruction)
+        self._server_instructions[zone_id] = temporary_instruction is not None and (
+            end is None or end > dt_util.utcnow()
+        )
+
+    async def async_set_temporary_instruction(self, zone_id, instruction, duration=120):
+        self._note_server_instruction(zone_id)
+        # Affichée tout de suite, envoyée une fois la fenêtre de regroupement
+        # écoulée : seule la dernière consigne demandée part à l'API
+        end_at = datetime.now(timezone.utc) + timedelta(minutes=duration)
+        self._apply_zone(
+            zone_id,
+            instruction=instruction,
+            temporary_instruction={
+                "end_at": end_at.isoformat(),
+                "set_point": {"instruction": instruction},
+            },
+        )
+        await self.zone_writes.async_request(
+            zone_id, self._async_write_temporary_instruction, instruction, duration
+        )
+
+    async def _async_write_temporary_instruction(self, zone_id, instruction, duration):
+        # Consigne déjà active : retirée d'abord plutôt qu'après un 409
+        replace_active = self._server_instructions.pop(zone_id, False)
+        try:
+            response = await self.client.set_temporary_instruction(
+                zone_id, instruction, duration, self.housing_id, replace=replace_active
+            )
+        finally:
+            self.async_schedule_refresh(zones=(zone_id,))
+        temporary_instruction = _event(response, "temporary_instruction")
+        if temporary_instruction is not None:
+            self._apply_zone(zone_id, temporary_instruction=temporary_instruction)
+
+    async def async_remove_temporary_instruction(self, zone_id):
+        self._note_server_instruction(zone_id)
+        # La consigne du planning n'est connue qu'avec la réponse
+        self._apply_zone(zone_id, temporary_instruction=None)
+        await self.zone_writes.async_request(
+            zone_id, self._async_write_remove_temporary_instruction
+        )
+
+    async def _async_write_remove_temporary_instruction(self, zone_id):
+        self._server_instructions.pop(zone_id, None)
+        try:
+            response = await self.client.remove_temporary_instruction(zone_id, self.housing_id)
+        finally:
+            self.async_schedule_refresh(zones=(zone_id,))
+        # La réponse donne la consigne du planning reprise par la zone
+        changes = _zone_changes(response)
+        if changes:
+            self._apply_zone(zone_id, **changes)
+
+    async def async_set_heating_system_state(self, state):
+        if state == "on":
+            await self.client.turn_on(self.housing_id)
+        else:
+            await self.client.turn_off(self.housing_id)
+        self._apply("thermal_details", heating_system_state=state)
+        self.async_schedule_refresh("thermal_details")
+
+    async def async_set_holiday(self, enabled):
+        if enabled:
+            response = await self.client.set_holiday(self.housing_id)
+            absence = _event(response, "absence") or {}
+        else:
+            await self.client.delete_holiday(self.housing_id)
+            absence = None
+        self._apply("thermal_details", absence=absence)
+        self.async_schedule_refresh("thermal_details")
+
+    async def async_set_absence(self, enabled):
+        if enabled:
+            response = await self.client.set_absence(self.housing_id)
+            time_shift = _event(response, "time_shift") or {}
+        else:
+            await self.client.delete_absence(self.housing_id)
+            time_shift = None
+        self._apply("thermal_details", time_shift=time_shift)
+        self.async_schedule_refresh("thermal_details")
+
+    async def async_set_custom_temperature(self, temp_id, value):
+        await self.client.set_custom_temperature(temp_id, value, self.housing_id)
+        temperatures = self._fields["temperatures"]
+        presets = dict(temperatures.presets)
+        if temp_id in presets:
+            presets[temp_id] = replace(presets[temp_id], value=value)
+        self._apply(
+            "temperatures",
+            temperatures=replace(
+                temperatures,
+                presets=presets,
+                values={**temperatures.values, temp_id: value},
+            ),
+        )
+        self.async_schedule_refresh("temperatures")
+
+    async def async_set_program(self, program_id):
+        await self.client.set_program(program_id, self.housing_id)
+        programs = {
+            program.id: replace(program, is_activated=program.id == program_id)
+            for program in self._fields["programs"].values()
+        }
+        self._apply(
+            "programs", programs=programs, active_program=programs.get(program_id)
+        )
+        self.async_schedule_refresh("programs")
+
+    async def async_set_schedule(self, zone_id, schedule_id):
+        active_program = self._fields["active_program"]
+        program_id = None if active_program is None else active_program.id
+        async with self.zone_writes.lane(zone_id):
+            await self.client.set_schedule(
+                zone_id, schedule_id, program_id, housing=self.housing_id
+            )
+        if active_program is not None:
+            active_program = replace(
+                active_program,
+                schedules={**active_program.schedules, zone_id: schedule_id},
+            )
+            self._apply(
+                "programs",
+                programs={**self._fields["programs"], program_id: active_program},
+                active_program=active_program,
+            )
+        # Le prochain créneau de la zone change avec son planning
+        self.async_schedule_refresh("programs", zones=(zone_id,))
+
+
+def _event(response, name):
+    """Return an event of a write response, if the API sent it back."""
+    if not isinstance(response, dict):
+        return None
+    return (response.get("events") or {}).get(name)
+
+
+def _zone_changes(response):
+    """Return the zone fields sent back by a write response."""
+    if not isinstance(response, dict):
+        return {}
+    changes = {}
+    events = response.get("events")
+    if isinstance(events, dict):
+        changes["temporary_instruction"] = events.get("temporary_instruction")
+    set_point = response.get("set_point")
+    if isinstance(set_point, dict) and "instruction" in set_point:
+        changes["instruction"] = set_point["instruction"]
+    return changes
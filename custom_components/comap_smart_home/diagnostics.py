@@ -0,0 +1,26 @@
+"""Diagnostics support for Comap Smart Home."""
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return the API usage and polling state of an entry, without credentials."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "options": dict(entry.options),
+        "rate_limit": entry_data["client"].rate_stats,
+        "temporary_instructions": entry_data["client"].instruction_stats,
+        "housings": {
+            housing_id: {
+                "update_interval": str(coordinator.update_interval),
+                "data_age": coordinator.data_age,
+                "section_errors": {
+                    section: repr(err) for section, err in coordinator.section_errors.items()
+                },
+            }
+            for housing_id, coordinator in entry_data["coordinators"].items()
+        },
+    }
@@ -0,0 +1,270 @@
+"""Typed, immutable snapshot of the Comap data of a housing.
+
+The coordinator parses each endpoint payload once into these classes and
+only keeps the fields the integration uses. Entities must never mutate a
+snapshot : updates build a new one with dataclasses.replace.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+
+@dataclass(frozen=True, slots=True)
+class Housing:
+    id: str
+    name: str
+    address: Any = None
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(id=data.get("id"), name=data.get("name"), address=data.get("address"))
+
+
+@dataclass(frozen=True, slots=True)
+class Zone:
+    id: str
+    title: str
+    set_point_type: str | None
+    instruction: Any
+    temperature: float | None
+    humidity: float | None
+    heating_status: str | None
+    next_timeslot_begin_at: str | None
+    next_instruction: Any
+    # Raw event, exposed as is by the temporary instruction switch
+    temporary_instruction: Mapping[str, Any] | None
+    last_presence_detected: str | None
+    connected_objects: tuple[str, ...]
+
+    @classmethod
+    def from_json(cls, data):
+        set_point = data.get("set_point") or {}
+        next_timeslot = data.get("next_timeslot") or {}
+        next_set_point = next_timeslot.get("set_point") or {}
+        events = data.get("events") or {}
+        return cls(
+            id=data.get("id"),
+            title=data.get("title"),
+            set_point_type=data.get("set_point_type"),
+            instruction=set_point.get("instruction"),
+            temperature=data.get("temperature"),
+            humidity=data.get("humidity"),
+            heating_status=data.get("heating_status"),
+            next_timeslot_begin_at=next_timeslot.get("begin_at"),
+            next_instruction=next_set_point.get("instruction"),
+            temporary_instruction=events.get("temporary_instruction"),
+            last_presence_detected=data.get("last_presence_detected"),
+            connected_objects=tuple(data.get("connected_objects") or ()),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ConnectedObject:
+    serial_number: str
+    model: str | None
+    communication_status: Any
+    has_battery: bool
+    voltage_percent: Any
+    voltage: Any
+    voltage_status: Any
+    # Raw payload, exposed as is by the device sensor
+    attributes: Mapping[str, Any]
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            serial_number=data.get("serial_number"),
+            model=data.get("model"),
+            communication_status=data.get("communication_status"),
+            has_battery="voltage_percent" in data,
+            voltage_percent=data.get("voltage_percent"),
+            voltage=data.get("voltage"),
+            voltage_status=data.get("voltage_status"),
+            attributes=data,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Program:
+    id: str
+    title: str
+    is_activated: bool
+    # zone id -> schedule id
+    schedules: Mapping[str, str]
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            id=data["id"],
+            title=data["title"],
+            is_activated=bool(data["is_activated"]),
+            schedules={zone["id"]: zone["schedule_id"] for zone in data["zones"]},
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Schedule:
+    id: str
+    title: str
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(id=data["id"], title=data["title"])
+
+
+@dataclass(frozen=True, slots=True)
+class Preset:
+    id: str
+    name: str
+    value: float | None
+    icon: str
+
+
+# Preset temperatures exposed by the integration : (id, group, name, icon)
+PRESETS = (
+    ("night", None, "Nuit", "mdi:weather-night"),
+    ("away", None, "Absence", "mdi:home-export-outline"),
+    ("frost_protection", None, "Hors Gel", "mdi:snowflake"),
+    ("presence_1", "connected", "Présence 1", "mdi:numeric-1-circle-outline"),
+    ("presence_2", "connected", "Présence 2", "mdi:numeric-2-circle-outline"),
+    ("presence_3", "connected", "Présence 3", "mdi:numeric-3-circle-outline"),
+    ("presence_4", "connected", "Présence 4", "mdi:numeric-4-circle-outline"),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class CustomTemperatures:
+    # Ordered as PRESETS
+    presets: Mapping[str, Preset]
+    # Every defined_temperature instruction -> temperature
+    values: Mapping[str, float]
+
+    @classmethod
+    def from_json(cls, data):
+        presets = {}
+        for preset_id, group, name, icon in PRESETS:
+            values = data if group is None else data[group]
+            presets[preset_id] = Preset(preset_id, name, values[preset_id], icon)
+        # Top level values win over "connected" ones, which win over "smart" ones
+        values = {}
+        for group in (data.get("smart"), data.get("connected"), data):
+            for key, value in (group or {}).items():
+                if not isinstance(value, dict):
+                    values[key] = value
+        return cls(presets=presets, values=values)
+
+
+@dataclass(frozen=True, slots=True)
+class ComapSnapshot:
+    housing: Housing
+    heating_system_state: str | None
+    services_available: Any
+    # Raw housing events, exposed as is by the holiday / absence switches
+    absence: Mapping[str, Any] | None
+    time_shift: Mapping[str, Any] | None
+    zones: Mapping[str, Zone]
+    zone_by_serial: Mapping[str, Zone]
+    objects: Mapping[str, ConnectedObject]
+    programs: Mapping[str, Program]
+    program_ids_by_title: Mapping[str, str]
+    active_program: Program | None
+    schedules: Mapping[str, Schedule]
+    schedule_ids_by_title: Mapping[str, str]
+    # zone id -> schedule applied by the active program
+    active_schedules: Mapping[str, Schedule]
+    temperatures: CustomTemperatures
+
+
+def parse_section(section, payload):
+    """Parse one endpoint payload into ComapSnapshot fields."""
+    if section == "housing":
+        return {"housing": Housing.from_json(payload)}
+
+    if section == "thermal_details":
+        zones = {}
+        zone_by_serial = {}
+        for zone_data in payload.get("zones"):
+            zone = Zone.from_json(zone_data)
+            zones[zone.id] = zone
+            for obj_serial in zone.connected_objects:
+                zone_by_serial[obj_serial] = zone
+        events = payload.get("events") or {}
+        return {
+            "heating_system_state": payload.get("heating_system_state"),
+            "services_available": payload.get("services_available"),
+            "absence": events.get("absence"),
+            "time_shift": events.get("time_shift"),
+            "zones": zones,
+            "zone_by_serial": zone_by_serial,
+        }
+
+    if section == "connected_objects":
+        objects = {}
+        for obj_data in payload:
+            obj = ConnectedObject.from_json(obj_data)
+            objects[obj.serial_number] = obj
+        return {"objects": objects}
+
+    if section == "programs":
+        programs = {}
+        active_program = None
+        for program_data in payload.get("programs"):
+            program = Program.from_json(program_data)
+            programs[program.id] = program
+            if program.is_activated:
+                active_program = program
+        return {
+            "programs": programs,
+            "program_ids_by_title": {
+                program.title: program.id for program in programs.values()
+            },
+            "active_program": active_program,
+        }
+
+    if section == "schedules":
+        schedules = {}
+        for schedule_data in payload:
+            schedule = Schedule.from_json(schedule_data)
+            schedules[schedule.id] = schedule
+        return {
+            "schedules": schedules,
+            "schedule_ids_by_title": {
+                schedule.title: schedule.id for schedule in schedules.values()
+            },
+        }
+
+    if section == "temperatures":
+        return {"temperatures": CustomTemperatures.from_json(payload)}
+
+    raise ValueError(f"Unknown section {section}")
+
+
+def empty_fields():
+    """Fields of the sections not fetched yet."""
+    return {
+        "heating_system_state": None,
+        "services_available": None,
+        "absence": None,
+        "time_shift": None,
+        "zones": {},
+        "zone_by_serial": {},
+        "objects": {},
+        "programs": {},
+        "program_ids_by_title": {},
+        "active_program": None,
+        "schedules": {},
+        "schedule_ids_by_title": {},
+        "temperatures": CustomTemperatures(presets={}, values={}),
+    }
+
+
+def build_snapshot(fields):
+    """Assemble a snapshot from the parsed fields of every section."""
+    active_program = fields["active_program"]
+    schedules = fields["schedules"]
+    active_schedules = {}
+    if active_program is not None:
+        for zone_id, schedule_id in active_program.schedules.items():
+            if schedule_id in schedules:
+                active_schedules[zone_id] = schedules[schedule_id]
+    return ComapSnapshot(active_schedules=active_schedules, **fields)
@@ -6,14 +6,9 @@ from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.restore_state import RestoreEntity
 
-from homeassistant.const import (
-    CONF_USERNAME,
-    CONF_PASSWORD,
-    UnitOfTemperature,
-)
+from homeassistant.const import UnitOfTemperature
 
 from .const import DOMAIN
-from .api import ComapClient
 
 from .comap_functions import build_name
 
@@ -25,15 +20,14 @@ async def async_setup_entry(
     async_add_entities,
 ) -> None:
 
-    config = config_entry.data
-    client = ComapClient(username=config[CONF_USERNAME], password=config[CONF_PASSWORD])
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
-
-    comap_temperatures = coordinator.data["comap_temperatures"]
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    client = entry_data["client"]
+    coordinators = entry_data["coordinators"]
 
     custom_temp = [
         ComapCustomTemp(coordinator, client, custom_temp)
-        for custom_temp in comap_temperatures
+        for coordinator in coordinators.values()
+        for custom_temp in coordinator.data.temperatures.presets.values()
     ]
 
     entities = custom_temp
@@ -47,25 +41,27 @@ class ComapCustomTemp(CoordinatorEntity, NumberEntity):
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing_id = coordinator.data["housing"].get("id")
-        self.housing_name = coordinator.data["housing"].get("name")
+        self.housing_id = coordinator.data.housing.id
+        self.housing_name = coordinator.data.housing.name
         self._attr_name = build_name(
             housing_name= self.housing_name,
-            entity_name="Temperature " + custom_temp.get("name")
+            entity_name="Temperature " + custom_temp.name
         )
-        self.temp_id = custom_temp.get("id")
+        self.temp_id = custom_temp.id
         self._attr_unique_id = self.housing_id + "_temp_" + self.temp_id
         self._attr_native_min_value = 5
         self._attr_native_max_value = 25
         self._attr_native_step = 0.5
         self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
 
+    @property
+    def available(self) -> bool:
+        """Unavailable once the preset is gone from the housing."""
+        return super().available and self.getTempValue(self.temp_id, self.coordinator.data) is not None
+
     @property
     def native_value(self):
-        comap_temperatures = self.coordinator.data["comap_temperatures"]
-        value = self.getTempValue(self.temp_id,comap_temperatures)
-        self._attr_available = value is not None
-        return value
+        return self.getTempValue(self.temp_id, self.coordinator.data)
     
     @property
     def icon(self) -> str:
@@ -78,18 +74,17 @@ class ComapCustomTemp(CoordinatorEntity, NumberEntity):
         return DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.coordinator.data["housing"].get("id"))
+                (DOMAIN, self.coordinator.data.housing.id)
             },
-            name = self.coordinator.data["housing"].get("name"),
+            name = self.coordinator.data.housing.name,
             manufacturer="comap",
         )
     
     async def async_set_native_value(self, value: float):
-        await self.client.set_custom_temperature(self.temp_id, value)
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_custom_temperature(self.temp_id, value)
     
-    def getTempValue(self,temp_id, comap_temperatures):
-        for temp in comap_temperatures:
-            if temp.get("id") == temp_id:
-                return temp.get("value")
-        return None
+    def getTempValue(self, temp_id, snapshot):
+        preset = snapshot.temperatures.presets.get(temp_id)
+        if preset is None:
+            return None
+        return preset.value
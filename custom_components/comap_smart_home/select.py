@@ -7,13 +7,6 @@ from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from .comap_functions import build_name
 
-from homeassistant.const import (
-    CONF_USERNAME,
-    CONF_PASSWORD,
-)
-
-from .api import ComapClient
-
 from .const import (
     DOMAIN,
 )
@@ -26,22 +19,22 @@ async def async_setup_entry(
     async_add_entities,
 ) -> None:
     
-    config = config_entry.data
-    client = ComapClient(username=config[CONF_USERNAME], password=config[CONF_PASSWORD])
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
-
-    thermal_details = coordinator.data["thermal_details"]
-    zones = thermal_details.get("zones")
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    client = entry_data["client"]
+    coordinators = entry_data["coordinators"]
 
     zones_selects = [
         ZoneScheduleSelect(coordinator, client, zone)
-        for zone in zones
+        for coordinator in coordinators.values()
+        for zone in coordinator.data.zones.values()
     ]
 
+    central_programs = [
+        ProgramSelect(coordinator, client)
+        for coordinator in coordinators.values()
+    ]
 
-    central_program = ProgramSelect(coordinator, client)
-
-    selects = zones_selects + [central_program]
+    selects = zones_selects + central_programs
 
     async_add_entities(selects, update_before_add=True)
 
@@ -51,15 +44,15 @@ class ZoneScheduleSelect(CoordinatorEntity, SelectEntity):
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
-            zone_name=zone.get("title"),
+            housing_name=coordinator.data.housing.name,
+            zone_name=zone.title,
             entity_name="Planning"
         )
-        self.zone_id = zone.get("id")
-        self._attr_unique_id = "zone_mode_" + zone.get("id")
-        self.zone_name = coordinator.data["housing"].get("name") + " " + zone.get("title")
+        self.zone_id = zone.id
+        self._attr_unique_id = "zone_mode_" + zone.id
+        self.zone_name = coordinator.data.housing.name + " " + zone.title
     
     @property
     def icon(self) -> str:
@@ -92,30 +85,23 @@ class ZoneScheduleSelect(CoordinatorEntity, SelectEntity):
     def options(self):
         list = [
             lib
-            for lib in self.coordinator.data["parsed_schedules"]
+            for lib in self.coordinator.data.schedule_ids_by_title
         ]
         return list
     
     @property
     def current_option(self):
-        active_program = self.coordinator.data["active_program"]
-        schedules = self.coordinator.data["schedules"]
-        return self.get_active_schedule_name(schedules,self.zone_id,active_program)
+        return self.get_active_schedule_name(self.coordinator.data, self.zone_id)
 
     async def async_select_option(self, option: str) -> None:
-        schedule_id = self.coordinator.data["parsed_schedules"][option]
-        await self.client.set_schedule(schedule_id,self.zone_id)
-        self._attr_current_option = option
-        await self.coordinator.async_request_refresh()
-
-    def get_active_schedule_name(self, schedules, zone_id, active_program) -> str:
-        zones = active_program["zones"]
-        for zone in zones:
-            if zone["id"] == zone_id:
-                id = zone["schedule_id"]
-        for schedule in schedules:
-            if (schedule["id"]) == id:
-                return schedule["title"]
+        schedule_id = self.coordinator.data.schedule_ids_by_title[option]
+        await self.coordinator.async_set_schedule(self.zone_id, schedule_id)
+
+    def get_active_schedule_name(self, snapshot, zone_id) -> str:
+        schedule = snapshot.active_schedules.get(zone_id)
+        if schedule is None:
+            return None
+        return schedule.title
             
 class ProgramSelect(CoordinatorEntity, SelectEntity):
 
@@ -123,12 +109,12 @@ class ProgramSelect(CoordinatorEntity, SelectEntity):
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             entity_name="Program"
         )
-        self.device_name = coordinator.data["housing"].get("name")
+        self.device_name = coordinator.data.housing.name
         self._unique_id = self.housing + "program"
     
     @property
@@ -151,9 +137,9 @@ class ProgramSelect(CoordinatorEntity, SelectEntity):
         return DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.coordinator.data["housing"].get("id"))
+                (DOMAIN, self.coordinator.data.housing.id)
             },
-            name = self.coordinator.data["housing"].get("name"),
+            name = self.coordinator.data.housing.name,
             manufacturer="comap",
         )
     
@@ -161,16 +147,17 @@ class ProgramSelect(CoordinatorEntity, SelectEntity):
     def options(self):
         list = [
             lib
-            for lib in self.coordinator.data["parsed_programs"]
+            for lib in self.coordinator.data.program_ids_by_title
         ]
         return list
     
     @property
     def current_option(self):
-        return self.coordinator.data["active_program_name"]
+        active_program = self.coordinator.data.active_program
+        if active_program is None:
+            return None
+        return active_program.title
 
     async def async_select_option(self, option: str) -> None:
-        program_id = self.coordinator.data["parsed_programs"][option]
-        await self.client.set_program(program_id)
-        self._attr_current_option = option
-        await self.coordinator.async_request_refresh()
+        program_id = self.coordinator.data.program_ids_by_title[option]
+        await self.coordinator.async_set_program(program_id)
@@ -5,6 +5,7 @@ from homeassistant.components.sensor import SensorEntity, SensorDeviceClass
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.const import PERCENTAGE
+from homeassistant.core import callback
 
 
 from .const import DOMAIN
@@ -13,27 +14,25 @@ from .comap_functions import get_connected_object_zone_infos, get_object_infos,
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    coordinators = hass.data[DOMAIN][config_entry.entry_id]["coordinators"]
 
-    themal_details = coordinator.data["thermal_details"]
-    connected_objects = coordinator.data["connected_objects"]
+    sensors = []
+    for coordinator in coordinators.values():
+        sensors += housing_sensors(coordinator)
 
-    zones = themal_details.get("zones")
-    obj_zone_names = {}
-    obj_zone_ids = {}
+    async_add_entities(sensors, True)
+
+def housing_sensors(coordinator):
+    """Build the sensors of one housing."""
+    connected_objects = coordinator.data.objects.values()
+
+    zones = coordinator.data.zones.values()
     last_pres = []
     for zone in zones:
-        zone_obj = zone.get("connected_objects")
-        for obj_serial in zone_obj:
-            obj_zone_names[obj_serial] = zone.get("title")
-            obj_zone_ids[obj_serial] = zone.get("id")
-        if (
-            "last_presence_detected" in zone.keys()
-            and zone["last_presence_detected"] != None
-        ):
+        if zone.last_presence_detected is not None:
             last_pres.append(
                 ComapLastPresenceSensor(
-                    coordinator=coordinator, zone_id=zone.get("id"), zone_name=zone.get("title")
+                    coordinator=coordinator, zone_id=zone.id, zone_name=zone.title
                 )
             )
 
@@ -44,12 +43,7 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 
     batt_list = []
     for object in connected_objects:
-        if ('voltage_percent' in object):
-            batt_list.append(object)
-
-    batt_list = []
-    for object in connected_objects:
-        if ('voltage_percent' in object):
+        if object.has_battery:
             batt_list.append(object)
     
     batt_sensors = [
@@ -57,76 +51,78 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
         for batt_sensor in batt_list
     ]
 
-    housing_sensors = [ComapHousingSensor(coordinator)]
+    info_sensors = [ComapHousingSensor(coordinator)]
 
     device_sensors = [
         ComapDeviceSensor(coordinator, device_sensor)
         for device_sensor in connected_objects
     ]
 
-    sensors = batt_sensors + housing_sensors + device_sensors + next_instr + last_pres
-
-    async_add_entities(sensors, True)
+    return batt_sensors + info_sensors + device_sensors + next_instr + last_pres
 
 class NextInstructionSensor(CoordinatorEntity, SensorEntity):
     def __init__(self, coordinator, zone):
         super().__init__(coordinator)
         self.coordinator = coordinator
-        self.housing_id = coordinator.data["housing"].get("id")
-        self.housing_name = coordinator.data["housing"].get("name")
-        self.zone_id = zone.get("id")
-        self.zone_name = self.housing_name + " " + zone.get("title")
-        self.is_pilot_wire = zone.get("set_point_type") == "pilot_wire"
+        self.housing_id = coordinator.data.housing.id
+        self.housing_name = coordinator.data.housing.name
+        self.zone_id = zone.id
+        self.zone_name = self.housing_name + " " + zone.title
+        self.is_pilot_wire = zone.set_point_type == "pilot_wire"
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
-            zone_name=zone.get("title"),
+            housing_name=coordinator.data.housing.name,
+            zone_name=zone.title,
             entity_name="Next instruction"
         )
+        self._derived_key = None
+        self._update_from_snapshot(coordinator.data)
+
+    @property
+    def available(self) -> bool:
+        """Unavailable once the zone is gone from the housing."""
+        return super().available and self.zone_id in self.coordinator.data.zones
 
     @property
     def name(self):
         return self._name
     
-    @property
-    def icon(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        next_timeslot = zone_data["next_timeslot"]
-        instr = next_timeslot["set_point"]["instruction"]
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Recompute the next instruction once per coordinator update."""
+        self._update_from_snapshot(self.coordinator.data)
+        super()._handle_coordinator_update()
+
+    def _update_from_snapshot(self, snapshot):
+        zone_data = get_zone_infos(self.zone_id, snapshot)
+        if zone_data is None:
+            return
+        key = (
+            zone_data.set_point_type,
+            zone_data.next_instruction,
+            zone_data.next_timeslot_begin_at,
+            snapshot.temperatures,
+        )
+        if key == self._derived_key:
+            return
+        self._derived_key = key
+
+        instr = zone_data.next_instruction
+        preset = None
+        if zone_data.set_point_type == "defined_temperature":
+            preset = snapshot.temperatures.presets.get(instr)
         if self.is_pilot_wire:
-            return ModeToIcon(instr)
+            self._attr_icon = ModeToIcon(instr)
+        elif preset is not None:
+            self._attr_icon = preset.icon
         else:
-            if zone_data.get("set_point_type") == "defined_temperature":
-                comap_temperatures = self.coordinator.data["comap_temperatures"]
-                for temp in comap_temperatures:
-                    if temp.get("id") == instr:
-                        return temp.get("icon")
-            return "mdi:help"
+            self._attr_icon = "mdi:help"
+        self._attr_native_value = instr if preset is None else preset.value
+        self._attr_extra_state_attributes = {
+            # Inconnu entre le changement de créneau et la relecture suivante
+            "next_timeslot": DateToHHMM(zone_data.next_timeslot_begin_at) if zone_data.next_timeslot_begin_at else None,
+            "next_instruction": instr,
+        }
 
-    
-    @property
-    def state(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        next_timeslot = zone_data["next_timeslot"]
-        instr = next_timeslot["set_point"]["instruction"]
-        if zone_data.get("set_point_type") == "defined_temperature":
-            comap_temperatures = self.coordinator.data["comap_temperatures"]
-            for temp in comap_temperatures:
-                if temp.get("id") == instr:
-                    instr = temp.get("value")
-        return instr
-    
-    @property
-    def extra_state_attributes(self):
-        attrs = {}
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        next_timeslot = zone_data["next_timeslot"]
-        attrs["next_timeslot"] = DateToHHMM(next_timeslot["begin_at"])
-        attrs["next_instruction"] = next_timeslot["set_point"]["instruction"]
-        return attrs
-    
     @property
     def device_info(self) -> DeviceInfo:
         """Return the device info."""
@@ -153,11 +149,11 @@ class ComapLastPresenceSensor(CoordinatorEntity, SensorEntity):
         self.zone_name = zone_name
         self._attr_device_class = SensorDeviceClass.TIMESTAMP
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             zone_name=zone_name,
             entity_name="Last presence"
         )
-        self._id = coordinator.data["housing"].get("id") + "_" + zone_id + "_last_presence"
+        self._id = coordinator.data.housing.id + "_" + zone_id + "_last_presence"
         self._is_on = None
 
     @property
@@ -183,20 +179,19 @@ class ComapLastPresenceSensor(CoordinatorEntity, SensorEntity):
     
     @property
     def state(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone = get_zone_infos(self.zone_id, thermal_details)
-        return zone.get("last_presence_detected")
+        zone = get_zone_infos(self.zone_id, self.coordinator.data)
+        return zone.last_presence_detected
 
 class ComapBatterySensor(CoordinatorEntity, SensorEntity):
     def __init__(self, coordinator, batt_sensor):
         super().__init__(coordinator)
-        self.housing = coordinator.data["housing"].get("id")
-        self.sn = batt_sensor.get("serial_number")
-        self.model = batt_sensor.get("model")
-        obj_zone_infos = get_connected_object_zone_infos(self.sn, coordinator.data["thermal_details"])
+        self.housing = coordinator.data.housing.id
+        self.sn = batt_sensor.serial_number
+        self.model = batt_sensor.model
+        obj_zone_infos = get_connected_object_zone_infos(self.sn, coordinator.data)
         self.zone_name = obj_zone_infos.get("title")
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             zone_name=self.zone_name,
             entity_name="Battery"
         )
@@ -214,9 +209,8 @@ class ComapBatterySensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state(self):
-        objects = self.coordinator.data.get("connected_objects")
-        infos = get_object_infos(self.sn, objects)
-        return infos.get("voltage_percent")
+        infos = get_object_infos(self.sn, self.coordinator.data)
+        return infos.voltage_percent
     
     @property
     def device_class(self):
@@ -232,11 +226,10 @@ class ComapBatterySensor(CoordinatorEntity, SensorEntity):
     
     @property
     def extra_state_attributes(self):
-        objects = self.coordinator.data.get("connected_objects")
-        infos = get_object_infos(self.sn, objects)
+        infos = get_object_infos(self.sn, self.coordinator.data)
         return {
-            "voltage": infos.get("voltage"),
-            "voltage_status" : infos.get("voltage_status")
+            "voltage": infos.voltage,
+            "voltage_status" : infos.voltage_status
         }
     
     @property
@@ -247,7 +240,7 @@ class ComapBatterySensor(CoordinatorEntity, SensorEntity):
                 # Serial numbers are unique identifiers within a specific domain
                 (DOMAIN, self.zone_id)
             },
-            name = self.coordinator.data["housing"].get("name") + " " + self.zone_name,
+            name = self.coordinator.data.housing.name + " " + self.zone_name,
             manufacturer = "comap",
             serial_number = self.zone_id
         )
@@ -256,12 +249,12 @@ class ComapHousingSensor(CoordinatorEntity, SensorEntity):
     def __init__(self, coordinator):
         super().__init__(coordinator)
         self.coordinator = coordinator
-        self.housing_id = coordinator.data["housing"].get("id")
+        self.housing_id = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             entity_name="Info"
         )
-        self._state = self._state = coordinator.data["thermal_details"].get("services_available")
+        self._state = coordinator.data.services_available
         self.attrs = {}
         self._id = self.housing_id + "_sensor"
 
@@ -277,16 +270,17 @@ class ComapHousingSensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        return thermal_details.get("services_available")
+        return self.coordinator.data.services_available
 
     @property
     def extra_state_attributes(self):
-        housing = self.coordinator.data["housing"]
+        housing = self.coordinator.data.housing
         attrs = {
             "automatic_update_value": get_now(),
             "automatic_update_label": "Mise à jour depuis comap : ",
-            "address":  housing.get("address")
+            "address":  housing.address,
+            "data_age": self.coordinator.data_age,
+            "stale_sections": sorted(self.coordinator.section_errors),
         }
         return attrs
 
@@ -307,18 +301,18 @@ class ComapDeviceSensor(CoordinatorEntity, SensorEntity):
     def __init__(self, coordinator, device_sensor):
         super().__init__(coordinator)
         self.coordinator = coordinator
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._state = None
-        self.sn = device_sensor.get("serial_number")
-        self.model = device_sensor.get("model")
+        self.sn = device_sensor.serial_number
+        self.model = device_sensor.model
         self.attrs = {}
         self.device_sensor = device_sensor
-        obj_zone_infos = get_connected_object_zone_infos(self.sn, coordinator.data["thermal_details"])
+        obj_zone_infos = get_connected_object_zone_infos(self.sn, coordinator.data)
         self.zone_name = obj_zone_infos.get("title")
         if self.zone_name is None:
             self.zone_name = ""
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             zone_name=obj_zone_infos.get("title"),
             entity_name=self.model.capitalize()
         )
@@ -349,14 +343,12 @@ class ComapDeviceSensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state(self):
-        objects = self.coordinator.data["connected_objects"]
-        infos = get_object_infos(self.sn, objects)
-        return infos.get("communication_status")
+        infos = get_object_infos(self.sn, self.coordinator.data)
+        return infos.communication_status
 
     @property
     def extra_state_attributes(self):
-        objects = self.coordinator.data["connected_objects"]
-        attrs = get_object_infos(self.sn, objects)
+        attrs = dict(get_object_infos(self.sn, self.coordinator.data).attributes)
         attrs["automatic_update_value"] = get_now()
         attrs["automatic_update_label"] = "Mise à jour depuis comap : "        
         return attrs
@@ -369,7 +361,7 @@ class ComapDeviceSensor(CoordinatorEntity, SensorEntity):
                 # Serial numbers are unique identifiers within a specific domain
                 (DOMAIN, self.zone_id)
             },
-            name = self.coordinator.data["housing"].get("name") + " " + self.zone_name,
+            name = self.coordinator.data.housing.name + " " + self.zone_name,
             manufacturer = "comap",
             serial_number = self.zone_id
         )
\ No newline at end of file
@@ -2,11 +2,9 @@ from typing import Any
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.components.switch import SwitchDeviceClass, SwitchEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.device_registry import DeviceInfo
 
-from .api import ComapClient
 from .const import DOMAIN
 
 from .comap_functions import get_zone_infos, build_name
@@ -17,18 +15,19 @@ async def async_setup_entry(
     async_add_entities,
 ) -> None:
     
-    config = config_entry.data
-    client = ComapClient(username=config[CONF_USERNAME], password=config[CONF_PASSWORD])
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
-
-    zones = coordinator.data["thermal_details"].get("zones")
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    client = entry_data["client"]
+    coordinators = entry_data["coordinators"]
 
     temporary_instructions_switches = [
         ComapZoneTemporarySwitch(coordinator, client, zone)
-        for zone in zones
+        for coordinator in coordinators.values()
+        for zone in coordinator.data.zones.values()
     ]
 
-    housing_switches = [ComapHousingOnOff(coordinator, client),ComapHousingHoliday(coordinator, client),ComapHousingAbsence(coordinator, client)]
+    housing_switches = []
+    for coordinator in coordinators.values():
+        housing_switches += [ComapHousingOnOff(coordinator, client),ComapHousingHoliday(coordinator, client),ComapHousingAbsence(coordinator, client)]
     zones_switches = temporary_instructions_switches
 
     switches = housing_switches + zones_switches
@@ -40,9 +39,9 @@ class ComapHousingOnOff(CoordinatorEntity,SwitchEntity):
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             entity_name="Global switch"
         )
         self._is_on = None
@@ -55,9 +54,9 @@ class ComapHousingOnOff(CoordinatorEntity,SwitchEntity):
         return DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.coordinator.data["housing"].get("id"))
+                (DOMAIN, self.coordinator.data.housing.id)
             },
-            name= self.coordinator.data["housing"].get("name"),
+            name= self.coordinator.data.housing.name,
             manufacturer="comap",
         )
 
@@ -73,25 +72,22 @@ class ComapHousingOnOff(CoordinatorEntity,SwitchEntity):
 
     @property
     def is_on(self):
-        zones = self.coordinator.data["thermal_details"]
-        return zones["heating_system_state"] == "on"
+        return self.coordinator.data.heating_system_state == "on"
 
     async def async_turn_on(self, **kwargs: Any) -> None:
-        await self.client.turn_on()
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_heating_system_state("on")
 
     async def async_turn_off(self, **kwargs: Any) -> None:
-        await self.client.turn_off()
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_heating_system_state("off")
     
 class ComapHousingHoliday(CoordinatorEntity, SwitchEntity):
     def __init__(self, coordinator, client) -> None:
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             entity_name="Holiday"
         )
         self._is_on = None
@@ -104,9 +100,9 @@ class ComapHousingHoliday(CoordinatorEntity, SwitchEntity):
         return DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.coordinator.data["housing"].get("id"))
+                (DOMAIN, self.coordinator.data.housing.id)
             },
-            name=self.coordinator.data["housing"].get("name"),
+            name=self.coordinator.data.housing.name,
             manufacturer="comap",
         )
 
@@ -122,35 +118,26 @@ class ComapHousingHoliday(CoordinatorEntity, SwitchEntity):
 
     @property
     def is_on(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        events = thermal_details.get("events")
-        if ('absence' in events):
-            return True
-        else:
-            return False
+        return self.coordinator.data.absence is not None
     
     @property
     def extra_state_attributes(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        events = thermal_details.get("events")
-        return events.get("absence")
+        return self.coordinator.data.absence
        
     async def async_turn_on(self, **kwargs: Any) -> None:
-        await self.client.set_holiday()
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_holiday(True)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
-        await self.client.delete_holiday()
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_holiday(False)
 
 class ComapHousingAbsence(CoordinatorEntity, SwitchEntity):
     def __init__(self, coordinator, client) -> None:
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
+            housing_name=coordinator.data.housing.name,
             entity_name="Absence"
         )
         self._is_on = None
@@ -162,9 +149,9 @@ class ComapHousingAbsence(CoordinatorEntity, SwitchEntity):
         return DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.coordinator.data["housing"].get("id"))
+                (DOMAIN, self.coordinator.data.housing.id)
             },
-            name=self.coordinator.data["housing"].get("name"),
+            name=self.coordinator.data.housing.name,
             manufacturer="comap",
         )
 
@@ -178,41 +165,32 @@ class ComapHousingAbsence(CoordinatorEntity, SwitchEntity):
 
     @property
     def is_on(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        events = thermal_details.get("events")
-        if ('time_shift' in events):
-            return True
-        else:
-            return False
+        return self.coordinator.data.time_shift is not None
     
     @property
     def extra_state_attributes(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        events = thermal_details.get("events")
-        return events.get("time_shift")
+        return self.coordinator.data.time_shift
        
     async def async_turn_on(self, **kwargs: Any) -> None:
-        await self.client.set_absence()
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_absence(True)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
-        await self.client.delete_absence()
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_set_absence(False)
 
 class ComapZoneTemporarySwitch(CoordinatorEntity, SwitchEntity):
     def __init__(self, coordinator, client, zone) -> None:
         super().__init__(coordinator)
         self.coordinator = coordinator
         self.client = client
-        self.housing = coordinator.data["housing"].get("id")
+        self.housing = coordinator.data.housing.id
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
-            zone_name = zone.get("title"),
+            housing_name=coordinator.data.housing.name,
+            zone_name = zone.title,
             entity_name="Temporary"
         )
-        self._id = zone.get("id") + "_temporary"
-        self.zone_name = zone.get("title")
-        self.zone_id = zone.get("id")
+        self._id = zone.id + "_temporary"
+        self.zone_name = zone.title
+        self.zone_id = zone.id
         self._extra_state_attributes = {}
 
     @property
@@ -223,7 +201,7 @@ class ComapZoneTemporarySwitch(CoordinatorEntity, SwitchEntity):
                 # Serial numbers are unique identifiers within a specific domain
                 (DOMAIN, self.zone_id)
             },
-            name= self.coordinator.data["housing"].get("name") + " " + self.zone_name,
+            name= self.coordinator.data.housing.name + " " + self.zone_name,
             manufacturer="comap",
             serial_number = self.zone_id
         )
@@ -250,13 +228,11 @@ class ComapZoneTemporarySwitch(CoordinatorEntity, SwitchEntity):
     
     @property
     def extra_state_attributes(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        events = zone_data.get("events")
+        zone_data = get_zone_infos(self.zone_id, self.coordinator.data)
+        temporary_instruction = zone_data.temporary_instruction
         attrs = {}
-        attrs["temporary_instruction"] = events.get("temporary_instruction")
-        if ('temporary_instruction' in events):
-            temporary_instruction = events.get("temporary_instruction")
+        attrs["temporary_instruction"] = temporary_instruction
+        if temporary_instruction is not None:
             attrs["end_at"] = temporary_instruction.get("end_at")
             attrs["instruction"] = temporary_instruction.get("set_point").get("instruction")
         else:
@@ -267,19 +243,11 @@ class ComapZoneTemporarySwitch(CoordinatorEntity, SwitchEntity):
     
     @property
     def is_on(self):
-        thermal_details = self.coordinator.data["thermal_details"]
-        zone_data = get_zone_infos(self.zone_id,thermal_details)
-        events = zone_data.get("events")
-        if ('temporary_instruction' in events):
-            return True
-        else:
-            return False
+        zone_data = get_zone_infos(self.zone_id, self.coordinator.data)
+        return zone_data.temporary_instruction is not None
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         return
     
     async def async_turn_off(self, **kwargs: Any) -> None:
-        response = await self.client.remove_temporary_instruction(self.zone_id)
-        events = response.get("events")
-        self.extra_state_attributes["temporary_instruction"] = events.get("temporary_instruction")
-        await self.coordinator.async_request_refresh()
\ No newline at end of file
+        await self.coordinator.async_remove_temporary_instruction(self.zone_id)
@@ -19,12 +19,12 @@ async def async_setup_entry(
     async_add_entities,
 ) -> None:
     
-    coordinator = hass.data[DOMAIN][config_entry.entry_id]
-    zones = coordinator.data["thermal_details"]["zones"]
+    coordinators = hass.data[DOMAIN][config_entry.entry_id]["coordinators"]
 
     zones_timer = [
         ComapZoneTimer(coordinator, zone, hass)
-        for zone in zones
+        for coordinator in coordinators.values()
+        for zone in coordinator.data.zones.values()
     ]
 
     entities = zones_timer
@@ -35,11 +35,11 @@ class ComapZoneTimer (TimeEntity, RestoreEntity):
     def __init__(self, coordinator, zone, hass):
         self.coordinator = coordinator
         self.hass = hass
-        self.zone_id = zone.get("id")
-        self.zone_name = coordinator.data["housing"].get("name") + " " + zone.get("title")
+        self.zone_id = zone.id
+        self.zone_name = coordinator.data.housing.name + " " + zone.title
         self._name = build_name(
-            housing_name=coordinator.data["housing"].get("name"),
-            zone_name=zone.get("title"),
+            housing_name=coordinator.data.housing.name,
+            zone_name=zone.title,
             entity_name="Temporary instruction duration"
         )
         self.timer_id = self.zone_id + "_timer"
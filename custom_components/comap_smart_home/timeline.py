@@ -0,0 +1,120 @@
+"""Known upcoming changes of a housing, read from its snapshot.
+
+Some states only change with time : a temporary instruction ends, a zone
+enters its next timeslot. They are projected locally at the exact time,
+the next poll confirming them.
+"""
+
+from dataclasses import replace
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+
+def parse_time(value):
+    """Parse a Comap timestamp, None if missing or invalid."""
+    if not isinstance(value, str):
+        return None
+    return dt_util.parse_datetime(value)
+
+
+def event_end(event):
+    """End of a raw Comap event (temporary instruction, absence...)."""
+    if not isinstance(event, dict):
+        return None
+    return parse_time(event.get("end_at"))
+
+
+def boundaries(snapshot):
+    """Yield the known changes of a snapshot, past ones included.
+
+    Boundaries are the next timeslot of each zone and the end of the
+    temporary instructions, absence and time shift events.
+    """
+    yield event_end(snapshot.absence)
+    yield event_end(snapshot.time_shift)
+    for zone in snapshot.zones.values():
+        yield parse_time(zone.next_timeslot_begin_at)
+        yield event_end(zone.temporary_instruction)
+
+
+def next_boundary(snapshot, now):
+    """Return the first known change after now, or None."""
+    return min(
+        (time for time in boundaries(snapshot) if time is not None and time > now),
+        default=None,
+    )
+
+
+def first_boundary(snapshot):
+    """Return the first known change, even if already past, or None."""
+    return min((time for time in boundaries(snapshot) if time is not None), default=None)
+
+
+def project_snapshot(snapshot, now):
+    """Return the zones and housing fields that changed by now.
+
+    Ended events are dropped, and a zone whose next timeslot began takes
+    its instruction ; the timeslot after it is unknown until the next poll.
+    """
+    zones = []
+    for zone in snapshot.zones.values():
+        changes = {}
+        temporary_end = event_end(zone.temporary_instruction)
+        if temporary_end is not None and temporary_end <= now:
+            changes["temporary_instruction"] = None
+        begin_at = parse_time(zone.next_timeslot_begin_at)
+        if begin_at is not None and begin_at <= now:
+            changes["next_timeslot_begin_at"] = None
+            changes["next_instruction"] = None
+            if changes.get("temporary_instruction", zone.temporary_instruction) is None:
+                changes["instruction"] = zone.next_instruction
+        if changes:
+            zones.append(replace(zone, **changes))
+    fields = {}
+    for name in ("absence", "time_shift"):
+        end = event_end(getattr(snapshot, name))
+        if end is not None and end <= now:
+            fields[name] = None
+    return zones, fields
+
+
+def has_temporary_instruction(snapshot):
+    return any(
+        zone.temporary_instruction is not None for zone in snapshot.zones.values()
+    )
+
+
+class PointInTimeCallback:
+    """Run an action at a single, replaceable point in time."""
+
+    def __init__(self, hass: HomeAssistant, action):
+        self.hass = hass
+        self._action = action
+        self._when = None
+        self._unsub = None
+
+    @callback
+    def schedule(self, when):
+        """Run the action at when (None cancels), replacing the previous time."""
+        if when == self._when:
+            return
+        self.cancel()
+        if when is None:
+            return
+        self._when = when
+        self._unsub = async_track_point_in_utc_time(self.hass, self._run, when)
+
+    @callback
+    def _run(self, now):
+        self._when = None
+        self._unsub = None
+        self._action(now)
+
+    @callback
+    def cancel(self):
+        if self._unsub is not None:
+            self._unsub()
+        self._when = None
+        self._unsub = None